@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""
+Optimizer benchmarks.
+
+Runs each solver in :mod:`optimize` on the Rosenbrock function over a
+range of dimensions, and the peak fits from testdy on synthetic poisson
+data, recording the wall time, the number of objective function calls,
+and the accuracy relative to the known optimum.  It also compares the
+evaluations `fmin` needs to reach a tolerance on the Rosenbrock function
+with the standard and the adaptive simplex coefficients, with and without
+restarts, and times the Rosenbrock Hessian-vector product and banded
+solve for large N.  The results are written as JSON so that runs from
+different versions can be compared.
+
+Example usage::
+
+    $ ./benchmark.py --dims 2,5,10 --output bench.json
+"""
+
+import sys
+import os
+import time
+import json
+import imp
+import platform
+import argparse
+
+import numpy as np
+
+import optimize
+from optimize import (fmin, fmin_batch, fmin_powell, fmin_lm, fminbound,
+                      brent, golden, brute, differential_evolution, rosen,
+                      rosen_hess_banded, rosen_hess_prod)
+
+ROSEN_DIMS = [2, 5, 10, 20, 50, 100]
+
+class Counter:
+    """Objective wrapper which counts calls, or rows for block objectives."""
+    def __init__(self, func, rows=False):
+        self.func = func
+        self.rows = rows
+        self.calls = 0
+    def __call__(self, x, *args):
+        self.calls += len(x) if self.rows else 1
+        return self.func(x, *args)
+
+def rosen_resid(x):
+    """Residuals whose sum of squares is rosen(x)."""
+    return np.hstack((10*(x[1:]-x[:-1]**2), 1-x[:-1]))
+
+def rosen_batch(P):
+    return np.sum(100.0*(P[:,1:]-P[:,:-1]**2.0)**2.0 + (1-P[:,:-1])**2.0,
+                  axis=1)
+
+def rosen_line(t):
+    """Rosenbrock on the curve x=(t,1), with minimum at t=1."""
+    return rosen(np.array([t, 1.0]))
+
+def _run(solver, repeat):
+    """Call solver() repeat times, returning its result and the best time."""
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.time()
+        result = solver()
+        best = min(best, time.time()-t0)
+    return result, best
+
+def rosen_cases(n):
+    """
+    Yield (solver name, solve function) for an n dimensional Rosenbrock
+    problem, where solve(counter_factory) returns (x, fval, warnflag).
+    """
+    x0 = np.tile([-1.2, 1.0], (n+1)//2)[:n]
+    def nm(wrap):
+        f = wrap(rosen)
+        x, fx, _it, _calls, warn = fmin(f, x0, full_output=1, disp=0)
+        return x, fx, warn
+    def powell(wrap):
+        f = wrap(rosen)
+        x, fx, _d, _it, _calls, warn = fmin_powell(f, x0, full_output=1,
+                                                   disp=0)
+        return x, fx, warn
+    def lm(wrap):
+        f = wrap(rosen_resid)
+        x, fx, _cov, _it, _calls, warn = fmin_lm(f, x0, full_output=1,
+                                                 disp=0)
+        return x, fx, warn
+    def batch(wrap):
+        # Four perturbed starts in lockstep; report the best.
+        f = wrap(rosen_batch, rows=True)
+        X0 = x0 * np.array([[1.0], [0.9], [1.1], [0.8]])
+        X, F, _it, _calls, warn = fmin_batch(f, X0, full_output=1, disp=0)
+        k = np.argmin(F)
+        return X[k], F[k], warn[k]
+    def de(wrap):
+        f = wrap(rosen_batch, rows=True)
+        x, fx, _it, _calls, warn = differential_evolution(
+            f, [(-5,5)]*n, seed=1, vectorized=True, full_output=1, disp=0)
+        return x, fx, warn
+    yield 'fmin', nm
+    yield 'fmin_powell', powell
+    yield 'fmin_lm', lm
+    yield 'fmin_batch', batch
+    if n <= 5:
+        yield 'diff_evolution', de
+    if n == 2:
+        def grid(wrap):
+            f = wrap(rosen)
+            x, fx = brute(f, ((-2,2),(-1,3)), Ns=40, full_output=1)[:2]
+            return x, fx, 0
+        def adaptive(wrap):
+            f = wrap(rosen_batch, rows=True)
+            x, fx = brute(f, ((-2,2),(-1,3)), Ns=5, vectorized=True,
+                          adaptive=True, full_output=1)[:2]
+            return x, fx, 0
+        yield 'brute', grid
+        yield 'brute_adaptive', adaptive
+
+def scalar_cases():
+    """Yield (solver name, solve function) for the 1-D problem rosen_line."""
+    def b(wrap):
+        x, fx, _it, _calls = brent(wrap(rosen_line), brack=(0,0.5),
+                                   full_output=1)
+        return np.array([x]), fx, 0
+    def g(wrap):
+        x, fx, _calls = golden(wrap(rosen_line), brack=(0,0.5), full_output=1)
+        return np.array([x]), fx, 0
+    def fb(wrap):
+        x, fx, warn, _calls = fminbound(wrap(rosen_line), 0, 2,
+                                        full_output=1, disp=0)
+        return np.array([x]), fx, warn
+    yield 'brent', b
+    yield 'golden', g
+    yield 'fminbound', fb
+
+def bench_rosen(dims, repeat):
+    results = []
+    cases = [(1, name, solve) for name, solve in scalar_cases()]
+    for n in dims:
+        cases.extend((n, name, solve) for name, solve in rosen_cases(n))
+    for n, name, solve in cases:
+        counters = []
+        def wrap(func, rows=False):
+            counters.append(Counter(func, rows=rows))
+            return counters[-1]
+        (x, fx, warn), t = _run(lambda: solve(wrap), repeat)
+        results.append(dict(
+            problem='rosen', n=n, solver=name, time=t,
+            funcalls=counters[-1].calls, fval=float(fx),
+            error=float(np.max(abs(np.asarray(x)-1))),
+            warnflag=int(warn)))
+        _report(results[-1])
+    return results
+
+SIMPLEX_DIMS = [2, 5, 10, 20, 30, 50]
+SIMPLEX_MODES = [
+    ('standard', {}),
+    ('restart', dict(restart=True)),
+    ('adaptive', dict(adaptive=True)),
+    ('adaptive+restart', dict(adaptive=True, restart=True)),
+    ]
+class TargetCounter(Counter):
+    """Counter which also records the calls needed to reach fval <= target."""
+    def __init__(self, func, target):
+        Counter.__init__(self, func)
+        self.target = target
+        self.reached = None
+    def __call__(self, x, *args):
+        fx = Counter.__call__(self, x, *args)
+        if self.reached is None and fx <= self.target:
+            self.reached = self.calls
+        return fx
+
+def bench_simplex(dims, budget, target=1e-6):
+    """
+    Evaluations for fmin to reach rosen(x) <= target from x=0 with the
+    standard and the dimension adaptive coefficients, with and without
+    restarts, given budget*N function evaluations.
+
+    With the default budget of 5000*N the target is reached after:
+
+        N   standard  restart  adaptive  adaptive+restart
+       10     4602     4602      3398        3398
+       20     none     63262    20791       20791
+       30     none     none     97667       97667
+       50     none     none     none        none
+    """
+    results = []
+    for n in dims:
+        for mode, opts in SIMPLEX_MODES:
+            f = TargetCounter(rosen, target)
+            t0 = time.time()
+            x, fx, _it, _calls, warn = fmin(f, np.zeros(n), xtol=1e-8,
+                                            ftol=1e-10, maxiter=budget*n,
+                                            maxfun=budget*n, full_output=1,
+                                            disp=0, **opts)
+            results.append(dict(
+                problem='rosen_simplex', n=n, solver='fmin', mode=mode,
+                time=time.time()-t0, funcalls=f.calls, target=target,
+                reached=f.reached, fval=float(fx),
+                error=float(np.max(abs(x-1))), warnflag=int(warn)))
+            _report(results[-1])
+    return results
+
+HESS_DIMS = [1000, 100000, 10000000]
+def bench_hessian(dims, repeat):
+    """
+    Time the Rosenbrock Hessian-vector product, and the banded Hessian
+    build, product and solve, reporting the solve residual as the error.
+    """
+    results = []
+    for n in dims:
+        x = np.linspace(-1, 2, n)
+        p = np.ones(n)
+        _, t = _run(lambda: rosen_hess_prod(x, p), repeat)
+        results.append(dict(problem='rosen_hess', n=n, solver='hess_prod',
+                            time=t, funcalls=1, error=0.0))
+        _report(results[-1])
+        H, t = _run(lambda: rosen_hess_banded(x), repeat)
+        results.append(dict(problem='rosen_hess', n=n, solver='banded',
+                            time=t, funcalls=1, error=0.0))
+        _report(results[-1])
+        Hp, t = _run(lambda: H.matvec(p), repeat)
+        results.append(dict(problem='rosen_hess', n=n, solver='matvec',
+                            time=t, funcalls=1,
+                            error=float(np.max(abs(Hp-rosen_hess_prod(x, p))))))
+        _report(results[-1])
+        s, t = _run(lambda: H.solve(p), repeat)
+        results.append(dict(problem='rosen_hess', n=n, solver='solve',
+                            time=t, funcalls=1,
+                            error=float(np.max(abs(H.matvec(s)-p)))))
+        _report(results[-1])
+    return results
+
+# Peak models: (form, target parameters)
+PEAKS = [
+    ('G', (100, 0.4, 0.1, 1)),
+    ('G', (100, 0.4, 0.1, 10)),
+    ('Q', (100, 0.4, 0.1, 1)),
+    ('C', (20, 0.3, 0.5, 3)),
+    ]
+def load_testdy():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdy')
+    return imp.load_source('testdy', path)
+
+def bench_peaks(trials, seed, repeat):
+    T = load_testdy()
+    x = np.linspace(0, 1, 30)
+    results = []
+    for form, target in PEAKS:
+        rng = np.random.RandomState(seed)
+        data = [rng.poisson(T.FORMS[form](x, *target)) for _ in range(trials)]
+        for cost in 'GP':
+            for method in ('simplex', 'newton'):
+                fn = T.FORMS[form]
+                counter = Counter(fn)
+                T.FORMS[form] = counter
+                try:
+                    def solve():
+                        return [T.peakfit(x, y, np.sqrt(y)+(y==0), cost=cost,
+                                          form=form, method=method)[0]
+                                for y in data]
+                    fits, t = _run(solve, repeat)
+                finally:
+                    T.FORMS[form] = fn
+                fits = np.array(fits)
+                dy = np.sqrt(data)+(np.asarray(data)==0)
+                if cost == 'P':
+                    dcost = [T.poisson_stat(fn, p, x, y)
+                             - T.poisson_stat(fn, target, x, y)
+                             for p, y in zip(fits, data)]
+                else:
+                    dcost = [T.chisq_stat(fn, p, x, y, dyk)
+                             - T.chisq_stat(fn, target, x, y, dyk)
+                             for p, y, dyk in zip(fits, data, dy)]
+                relerr = (fits - target)/np.asarray(target, float)
+                results.append(dict(
+                    problem='peak', form=form, target=list(target),
+                    cost=cost, method=method, trials=trials,
+                    time=t/trials, funcalls=counter.calls/float(trials*repeat),
+                    dfval=float(np.mean(dcost)),
+                    error=float(np.sqrt(np.mean(relerr**2)))))
+                _report(results[-1])
+    return results
+
+def _report(r):
+    if r['problem'] == 'rosen':
+        label = "rosen n=%-3d %-14s" % (r['n'], r['solver'])
+    elif r['problem'] == 'rosen_hess':
+        label = "hessian n=%-8d %-9s" % (r['n'], r['solver'])
+    elif r['problem'] == 'rosen_simplex':
+        label = "simplex n=%-3d %-16s" % (r['n'], r['mode'])
+        print >>sys.stderr, "%-30s %10.4f s %8d calls  to target %-8s" \
+            "fval %.3g" % (label, r['time'], r['funcalls'], r['reached'],
+                           r['fval'])
+        return
+    else:
+        label = "peak %s/%s bkg=%-3g %-9s" % (r['form'], r['cost'],
+                                              r['target'][3], r['method'])
+    print >>sys.stderr, "%-30s %10.4f s %8d calls  error %.3g" \
+        % (label, r['time'], r['funcalls'], r['error'])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dims', default=','.join(str(n) for n in ROSEN_DIMS),
+                        help='comma separated rosen dimensions [%(default)s]')
+    parser.add_argument('--simplex-dims',
+                        default=','.join(str(n) for n in SIMPLEX_DIMS),
+                        help='rosen dimensions for comparing the fmin '
+                        'coefficients and restarts [%(default)s]')
+    parser.add_argument('--simplex-budget', type=int, default=5000,
+                        help='function evaluations per dimension allowed '
+                        'for the fmin comparison [%(default)s]')
+    parser.add_argument('--hess-dims',
+                        default=','.join(str(n) for n in HESS_DIMS),
+                        help='rosen dimensions for timing the Hessian '
+                        'product and solve [%(default)s]')
+    parser.add_argument('--trials', type=int, default=20,
+                        help='synthetic data sets per peak model [%(default)s]')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='time the best of this many runs [%(default)s]')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='random seed for the peak data [%(default)s]')
+    parser.add_argument('--skip-peaks', action='store_true',
+                        help='only run the rosen benchmarks')
+    parser.add_argument('--output', default='-',
+                        help='JSON output file, or - for stdout [%(default)s]')
+    opts = parser.parse_args()
+
+    dims = [int(v) for v in opts.dims.split(',') if v]
+    results = bench_rosen(dims, opts.repeat)
+    simplex_dims = [int(v) for v in opts.simplex_dims.split(',') if v]
+    results.extend(bench_simplex(simplex_dims, opts.simplex_budget))
+    hess_dims = [int(v) for v in opts.hess_dims.split(',') if v]
+    results.extend(bench_hessian(hess_dims, opts.repeat))
+    if not opts.skip_peaks:
+        results.extend(bench_peaks(opts.trials, opts.seed, opts.repeat))
+    report = dict(
+        version=optimize.__version__,
+        date=time.strftime('%Y-%m-%d %H:%M:%S'),
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        results=results,
+        )
+    if opts.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print
+    else:
+        with open(opts.output, 'w') as fid:
+            json.dump(report, fid, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    main()
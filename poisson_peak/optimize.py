@@ -17,13 +17,21 @@
 
 # Minimization routines
 
-__all__ = ['fmin', 'fmin_powell',
-           'fminbound','brent', 'golden','bracket','rosen','rosen_der',
-           'rosen_hess', 'rosen_hess_prod', 'brute', 'approx_fprime',
-           'check_grad']
+__all__ = ['fmin', 'fmin_batch', 'fmin_multistart', 'fmin_powell',
+           'NelderMead', 'Powell',
+           'fminbound','brent', 'golden','bracket', 'fminbound_batch',
+           'brent_batch', 'golden_batch', 'bracket_batch', 'rosen','rosen_der',
+           'rosen_hess', 'rosen_hess_banded', 'rosen_hess_prod',
+           'SymmetricTridiagonal', 'brute', 'differential_evolution',
+           'approx_fprime',
+           'check_grad', 'approx_grad', 'approx_hess_p', 'approx_jacobian',
+           'fmin_lm', 'fmin_poisson', 'Trace', 'Budget']
 
 __docformat__ = "restructuredtext en"
 
+import time
+from collections import OrderedDict
+
 import numpy
 from numpy import atleast_1d, eye, mgrid, argmin, zeros, shape, \
      squeeze, vectorize, asarray, absolute, sqrt, Inf, asfarray, isinf
@@ -114,8 +122,90 @@ def rosen_der(x):
     der[-1] = 200*(x[-1]-x[-2]**2)
     return der
 
-def rosen_hess(x):
-    """The Hessian matrix of the Rosenbrock function.
+class SymmetricTridiagonal:
+    """
+    Symmetric tridiagonal matrix stored as its diagonal *d* (length N) and
+    off-diagonal *e* (length N-1), such as the Hessian of `rosen`.
+
+    All operations take O(N) time and memory.  The LAPACK upper banded
+    form used by ``scipy.linalg.solveh_banded`` is ``ab = [[0]+e, d]``.
+    """
+    def __init__(self, d, e):
+        self.d = asarray(d)
+        self.e = asarray(e)
+        if self.e.shape != (len(self.d)-1,):
+            raise ValueError("off-diagonal must have one fewer element "
+                             "than the diagonal")
+
+    def __len__(self):
+        return len(self.d)
+
+    def matvec(self, p):
+        """Matrix-vector product H p."""
+        p = asarray(p)
+        Hp = self.d*p
+        Hp[:-1] += self.e*p[1:]
+        Hp[1:] += self.e*p[:-1]
+        return Hp
+
+    def solve(self, b):
+        """
+        Solve H x = b by cyclic reduction.
+
+        Each level eliminates the odd rows from the even rows using
+        whole-array operations, so the solve takes O(N) work in
+        log2(N) vectorized passes.  No pivoting is done, so H should be
+        positive definite or diagonally dominant.
+        """
+        d = asfarray(self.d)
+        e = asfarray(self.e)
+        lower = numpy.hstack(([0.], e))
+        upper = numpy.hstack((e, [0.]))
+        return _cyclic_reduction(lower, d, upper, asfarray(b))
+
+    def todense(self):
+        """The full N by N matrix."""
+        N = len(self.d)
+        H = numpy.zeros((N,N), dtype=numpy.result_type(self.d, self.e))
+        idx = numpy.arange(N)
+        H[idx,idx] = self.d
+        H[idx[:-1],idx[1:]] = self.e
+        H[idx[1:],idx[:-1]] = self.e
+        return H
+
+def _cyclic_reduction(a, b, c, y):
+    """
+    Solve the tridiagonal system a[i] x[i-1] + b[i] x[i] + c[i] x[i+1] = y[i],
+    with a[0] = c[-1] = 0.
+    """
+    N = len(b)
+    if N == 1:
+        return y/b
+    # The reduced system is formed from the m even rows by eliminating
+    # their k odd neighbours; every odd row has an even row above it.
+    m, k = (N+1)//2, N//2
+    ao, bo, co, yo = a[1::2], b[1::2], c[1::2], y[1::2]
+    alpha = -a[2::2]/bo[:m-1]
+    gamma = -c[0::2][:k]/bo
+    an, cn = numpy.zeros(m), numpy.zeros(m)
+    an[1:] = alpha*ao[:m-1]
+    cn[:k] = gamma*co
+    bn = b[0::2].copy()
+    bn[1:] += alpha*co[:m-1]
+    bn[:k] += gamma*ao
+    yn = y[0::2].copy()
+    yn[1:] += alpha*yo[:m-1]
+    yn[:k] += gamma*yo
+    x = numpy.empty(N)
+    x[0::2] = xe = _cyclic_reduction(an, bn, cn, yn)
+    # Back substitute for the odd rows.
+    xo = yo - ao*xe[:k]
+    xo[:m-1] -= co[:m-1]*xe[1:]
+    x[1::2] = xo/bo
+    return x
+
+def rosen_hess_banded(x):
+    """The Hessian matrix of the Rosenbrock function in tridiagonal form.
 
     Parameters
     ----------
@@ -124,23 +214,41 @@ def rosen_hess(x):
 
     Returns
     -------
-    hess : 2D numpy array
-        The Hessian matrix of the Rosenbrock function at `x`.
+    hess : SymmetricTridiagonal
+        The Hessian matrix of the Rosenbrock function at `x`, with
+        `matvec`, `solve` and `todense` methods.
 
     See Also
     --------
-    rosen, rosen_der, rosen_hess_prod
+    rosen, rosen_der, rosen_hess, rosen_hess_prod
     """
     x = atleast_1d(x)
-    H = numpy.diag(-400*x[:-1],1) - numpy.diag(400*x[:-1],-1)
     diagonal = numpy.zeros(len(x), dtype=x.dtype)
     diagonal[0] = 1200*x[0]**2 - 400*x[1] + 2
     diagonal[-1] = 200
     diagonal[1:-1] = 202 + 1200*x[1:-1]**2 - 400*x[2:]
-    H = H + numpy.diag(diagonal)
-    return H
+    return SymmetricTridiagonal(diagonal, -400*x[:-1])
+
+def rosen_hess(x):
+    """The Hessian matrix of the Rosenbrock function.
+
+    Parameters
+    ----------
+    x : array_like, 1D
+        The point at which the Hessian matrix is to be computed.
+
+    Returns
+    -------
+    hess : 2D numpy array
+        The Hessian matrix of the Rosenbrock function at `x`.
+
+    See Also
+    --------
+    rosen, rosen_der, rosen_hess_banded, rosen_hess_prod
+    """
+    return rosen_hess_banded(x).todense()
 
-def rosen_hess_prod(x,p):
+def rosen_hess_prod(x,p,blocksize=65536):
     """Product of the Hessian matrix of the Rosenbrock function with a vector.
 
     Parameters
@@ -149,6 +257,10 @@ def rosen_hess_prod(x,p):
         The point at which the Hessian matrix is to be computed.
     p : array_like, 1D, same size as `x`.
         The vector to be multiplied by the Hessian matrix.
+    blocksize : int
+        Number of elements processed at a time.  Work arrays are limited
+        to this size, so memory beyond the result stays constant for
+        large vectors.
 
     Returns
     -------
@@ -158,25 +270,629 @@ def rosen_hess_prod(x,p):
 
     See Also
     --------
-    rosen, rosen_der, rosen_hess
+    rosen, rosen_der, rosen_hess, rosen_hess_banded
     """
     x = atleast_1d(x)
-    Hp = numpy.zeros(len(x), dtype=x.dtype)
+    p = asarray(p)
+    N = len(x)
+    Hp = numpy.zeros(N, dtype=x.dtype)
     Hp[0] = (1200*x[0]**2 - 400*x[1] + 2)*p[0] - 400*x[0]*p[1]
-    Hp[1:-1] = -400*x[:-2]*p[:-2]+(202+1200*x[1:-1]**2-400*x[2:])*p[1:-1] \
-               -400*x[1:-1]*p[2:]
+    # Hp[i] = -400 x[i-1] p[i-1] + (202 + 1200 x[i]**2 - 400 x[i+1]) p[i]
+    #         - 400 x[i] p[i+1], evaluated in the same order as a single
+    # expression but one block at a time.
+    dtype = numpy.result_type(x, p, 1.0)
+    t = numpy.empty(pymin(blocksize, N), dtype=dtype)
+    u = numpy.empty_like(t)
+    for start in range(1, N-1, blocksize):
+        stop = pymin(start+blocksize, N-1)
+        n = stop-start
+        xm = x[start:stop]
+        tb, ub = t[:n], u[:n]
+        numpy.multiply(xm, xm, tb)
+        tb *= 1200
+        tb += 202
+        numpy.multiply(x[start+1:stop+1], 400, ub)
+        tb -= ub
+        tb *= p[start:stop]
+        numpy.multiply(x[start-1:stop-1], -400, ub)
+        ub *= p[start-1:stop-1]
+        tb += ub
+        numpy.multiply(xm, 400, ub)
+        ub *= p[start+1:stop+1]
+        tb -= ub
+        Hp[start:stop] = tb
     Hp[-1] = -400*x[-2]*p[-2] + 200*p[-1]
     return Hp
 
-def wrap_function(function, args):
+class FunctionCache:
+    """
+    Bounded least-recently-used store of objective function values.
+
+    Values are keyed on the exact bytes of the float parameter vector, so
+    only bit-identical points are reused.  A cache may be shared between
+    several minimizer calls (restarts, or a `brute` search followed by its
+    `finish`) provided they all minimize the same function with the same
+    extra arguments.  *hits* and *misses* count lookups since creation.
+    """
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._store = OrderedDict()
+
+    def _key(self, x):
+        return asarray(x, dtype=float).tostring()
+
+    def get(self, x):
+        """Return the cached value at x, or None if x has not been seen."""
+        key = self._key(x)
+        if key in self._store:
+            # Move the entry to the most recently used end.
+            value = self._store.pop(key)
+            self._store[key] = value
+            self.hits += 1
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, x, value):
+        """Record func(x) = value, evicting the oldest entry if full."""
+        self._store[self._key(x)] = value
+        if len(self._store) > self.maxsize:
+            self._store.popitem(last=False)
+
+    def stats(self):
+        return self.hits, self.misses
+
+class Trace:
+    """
+    Per-iteration record of a minimizer's progress.
+
+    Pass a Trace as the *trace* argument of a minimizer to collect one
+    record per iteration containing:
+
+        *iter*      iteration number
+        *funcalls*  function calls so far
+        *fval*      best function value so far
+        *size*      simplex diameter, bracket width or step length
+        *step*      kind of step taken, e.g., reflect, expand, contract,
+                    inside, shrink, golden, parabolic or grid
+        *time*      wall time since the trace started
+        *ftime*     wall time spent inside the objective function
+
+    The time in optimizer overhead is ``time - ftime``.  Use `array` to
+    convert the records to a numpy record array.  If *emit* is given, it
+    is called with each record as it is produced.  The same trace can be
+    given to several minimizers in turn, for example `brute` and its
+    `finish`, in which case the *step* field separates them.
+    """
+    dtype = [('iter', int), ('funcalls', int), ('fval', float),
+             ('size', float), ('step', 'S10'), ('time', float),
+             ('ftime', float)]
+
+    def __init__(self, emit=None):
+        self.emit = emit
+        self.records = []
+        self.ftime = 0.0
+        self.start = time.time()
+        self._depth = 0
+
+    def timed(self, func):
+        """Wrap func so that time spent inside it is accumulated."""
+        def timed_function(*args):
+            # Only time the outermost call if timed functions are nested.
+            if self._depth:
+                return func(*args)
+            self._depth += 1
+            t0 = time.time()
+            try:
+                return func(*args)
+            finally:
+                self.ftime += time.time() - t0
+                self._depth -= 1
+        return timed_function
+
+    def record(self, iter, funcalls, fval, size, step):
+        rec = (iter, funcalls, fval, size, step,
+               time.time() - self.start, self.ftime)
+        self.records.append(rec)
+        if self.emit is not None:
+            self.emit(rec)
+
+    def array(self):
+        return numpy.rec.fromrecords(self.records, dtype=self.dtype) \
+            if self.records else numpy.recarray((0,), dtype=self.dtype)
+
+class Budget:
+    """
+    Limit on the wall time and objective function calls of a fit.
+
+    Pass a Budget as the *budget* argument of one or more minimizers to
+    bound their total cost.  *seconds* caps the wall time since the budget
+    was created or `reset`, and *calls* caps the total number of
+    evaluations of the objective function, including those made by nested
+    searches such as the line searches of `fmin_powell` or the `finish`
+    of `brute`.  Cache hits are free.  The limits are checked before each
+    evaluation, so a single slow evaluation can overrun *seconds*.
+
+    When the budget runs out, the minimizer stops and returns the best
+    point it has evaluated, with warnflag 3 if it returns a warnflag.
+    *exceeded* is set once an evaluation has been refused, and *ncalls*
+    counts the evaluations charged so far.
+    """
+    def __init__(self, seconds=None, calls=None):
+        self.seconds = seconds
+        self.calls = calls
+        self.reset()
+
+    def reset(self):
+        """Restart the clock and the call count."""
+        self.start = time.time()
+        self.ncalls = 0
+        self.exceeded = False
+
+    def elapsed(self):
+        return time.time() - self.start
+
+    def charge(self, n=1):
+        """Count n evaluations, or raise _BudgetExceeded if they don't fit."""
+        if ((self.calls is not None and self.ncalls + n > self.calls)
+            or (self.seconds is not None and self.elapsed() >= self.seconds)):
+            self.exceeded = True
+            raise _BudgetExceeded()
+        self.ncalls += n
+
+class _BudgetExceeded(Exception):
+    """Raised by an objective wrapper when its Budget is spent."""
+    pass
+
+class _BudgetFunction:
+    """
+    Objective wrapper which charges each call to a Budget and remembers
+    the best point evaluated.  If *block*, func evaluates each row of an
+    (M,N) array of points and each row is charged as one call.
+    """
+    def __init__(self, func, budget, block=False):
+        self.func = func
+        self.budget = budget
+        self.block = block
+        self.ncalls = 0
+        self.x, self.fx = None, Inf
+
+    def __call__(self, x, *args):
+        n = len(x) if self.block else 1
+        self.budget.charge(n)
+        self.ncalls += n
+        fx = self.func(x, *args)
+        if self.block:
+            F = asarray(fx, dtype=float)
+            k = argmin(F)
+            if F[k] < self.fx:
+                self.x, self.fx = asarray(x[k]).copy(), F[k]
+        elif fx < self.fx:
+            self.x, self.fx = (x.copy() if hasattr(x, 'copy') else x), fx
+        return fx
+
+    def best(self, x=None, fx=Inf):
+        """The better of the best point evaluated and (x, fx)."""
+        if x is None or self.fx < fx:
+            return self.x, self.fx
+        return x, fx
+
+def _make_cache(cache):
+    """Convert the *cache* argument of a minimizer to a FunctionCache."""
+    if cache is None or isinstance(cache, FunctionCache):
+        return cache
+    return FunctionCache(cache) if cache > 0 else None
+
+def wrap_function(function, args, cache=None):
+    # Calls are counted once they return, so that a call refused by a
+    # Budget is not reported as made.
     ncalls = [0]
-    def function_wrapper(x):
-        ncalls[0] += 1
-        return function(x, *args)
+    if cache is None:
+        def function_wrapper(x):
+            value = function(x, *args)
+            ncalls[0] += 1
+            return value
+    else:
+        def function_wrapper(x):
+            value = cache.get(x)
+            if value is None:
+                value = function(x, *args)
+                cache.put(x, value)
+            ncalls[0] += 1
+            return value
     return ncalls, function_wrapper
 
+def wrap_points(function, args, ncalls, cache=None, vectorized=False,
+                mapper=None):
+    """
+    Like `wrap_function`, but the wrapper evaluates each row of a block
+    of points, counting each row as a call once the block returns.  The
+    block is passed to function directly if *vectorized*, otherwise the
+    points are evaluated through *mapper* (see `approx_grad`) or one at a
+    time.
+    """
+    def points_wrapper(X):
+        X = asarray(X)
+        if cache is None:
+            F = _evaluate_points(function, X, args, vectorized, mapper)
+            ncalls[0] += len(X)
+            return F
+        F = [cache.get(x) for x in X]
+        miss = [i for i,v in enumerate(F) if v is None]
+        if miss:
+            Fmiss = _evaluate_points(function, X[miss], args,
+                                     vectorized, mapper)
+            for i,v in zip(miss, Fmiss):
+                cache.put(X[i], v)
+                F[i] = v
+        ncalls[0] += len(X)
+        return asarray(F, dtype=float)
+    return points_wrapper
+
+class _BoxTransform:
+    """
+    Map unconstrained internal parameters onto a box of bounds.
+
+    Each bounds entry is a (lower, upper) pair, with None or inf for no
+    limit.  As in MINUIT, a parameter with both limits uses
+    ``x = lo + (hi-lo)*(sin(u)+1)/2`` and a parameter with one limit uses
+    ``x = lo - 1 + sqrt(u**2+1)`` or ``x = hi + 1 - sqrt(u**2+1)``, so
+    every internal point maps to a feasible external point.
+    """
+    def __init__(self, bounds, n):
+        bounds = list(bounds)
+        if len(bounds) != n:
+            raise ValueError("bounds must give a (lower, upper) pair "
+                             "for each of the %d parameters" % n)
+        self.lo = numpy.array([-Inf if lo is None else lo
+                               for lo, hi in bounds], dtype=float)
+        self.hi = numpy.array([Inf if hi is None else hi
+                               for lo, hi in bounds], dtype=float)
+        if (self.lo > self.hi).any():
+            raise ValueError("The lower bound exceeds the upper bound.")
+        haslo, hashi = ~isinf(self.lo), ~isinf(self.hi)
+        self.both = numpy.nonzero(haslo & hashi)[0]
+        self.lower = numpy.nonzero(haslo & ~hashi)[0]
+        self.upper = numpy.nonzero(~haslo & hashi)[0]
+
+    def clip(self, x):
+        return numpy.clip(asfarray(x), self.lo, self.hi)
+
+    def to_external(self, u):
+        """Feasible parameters for the internal parameters u (or rows of u)."""
+        u = asfarray(u)
+        x = u.copy()
+        b, l, h = self.both, self.lower, self.upper
+        lo, hi = self.lo, self.hi
+        x[...,b] = lo[b] + (hi[b]-lo[b])*(numpy.sin(u[...,b])+1)/2
+        x[...,l] = lo[l] - 1 + sqrt(u[...,l]**2+1)
+        x[...,h] = hi[h] + 1 - sqrt(u[...,h]**2+1)
+        # Clip rounding errors at the limits.
+        return numpy.clip(x, lo, hi)
+
+    def to_internal(self, x):
+        """Internal parameters for x, which is first clipped to the box."""
+        x = self.clip(x)
+        u = x.copy()
+        b, l, h = self.both, self.lower, self.upper
+        lo, hi = self.lo, self.hi
+        width = hi[b]-lo[b]
+        scaled = 2*(x[...,b]-lo[b])/numpy.where(width > 0, width, 1) - 1
+        u[...,b] = numpy.arcsin(numpy.clip(scaled, -1, 1))
+        u[...,l] = sqrt((x[...,l]-lo[l]+1)**2 - 1)
+        u[...,h] = sqrt((hi[h]-x[...,h]+1)**2 - 1)
+        return u
+
+    def simplex(self, x0, nonzdelt, zdelt):
+        """
+        Internal (N+1,N) simplex for the initial simplex that `fmin` would
+        build around x0, with steps that leave the box taken the other way.
+        """
+        x0 = self.clip(asfarray(x0).flatten())
+        N = len(x0)
+        sim = numpy.repeat(x0[None,:], N+1, axis=0)
+        for k in range(N):
+            delta = nonzdelt*x0[k] if x0[k] != 0 else zdelt
+            if not (self.lo[k] <= x0[k]+delta <= self.hi[k]):
+                delta = -delta
+            sim[k+1,k] = x0[k] + delta
+        return self.to_internal(sim)
+
+class _BoundedFunction:
+    """Picklable func(x,*args) of the internal parameters of a box."""
+    def __init__(self, func, box):
+        self.func = func
+        self.box = box
+    def __call__(self, u, *args):
+        return self.func(self.box.to_external(u), *args)
+
+class NelderMead:
+    """
+    Downhill simplex minimizer which keeps its state between steps.
+
+    The simplex is started from the point *x0* as in `fmin`, or *x0* may
+    be an existing (N+1,N) simplex to warm-start from a previous fit.
+    Use `step` to take one iteration or `run` to iterate until convergence
+    or until the total iteration and function evaluation counts reach
+    their limits.  Because the limits are totals, a run can be time-sliced
+    by calling `run` with increasing *maxfun*.
+
+    `state` returns a dictionary of arrays and numbers from which
+    `NelderMead.from_state` rebuilds the optimizer, so a long fit can be
+    checkpointed with ``numpy.savez(path, **opt.state())`` and resumed
+    with ``NelderMead.from_state(func, numpy.load(path))``.
+
+    If *adaptive*, the reflection, expansion, contraction and shrink
+    coefficients depend on the dimension N as given by Gao and Han (2012),
+    ``rho=1, chi=1+2/N, psi=0.75-1/(2N), sigma=1-1/N``, which avoids the
+    stagnation of the standard coefficients for N above about 10.  If
+    *restart*, a fresh simplex is built around the best vertex when the
+    simplex has converged or become degenerate (see `degenerate`, which
+    is checked after each contraction or shrink step), and
+    the search stops once a restart no longer improves the minimum by
+    more than ftol.
+    """
+    rho = 1; chi = 2; psi = 0.5; sigma = 0.5
+    nonzdelt = 0.05
+    zdelt = 0.00025
+    degenerate_tol = 1e4
+
+    def __init__(self, func, x0, args=(), xtol=1e-4, ftol=1e-4, cache=None,
+                 adaptive=False, restart=False):
+        self.xtol = xtol
+        self.ftol = ftol
+        self.fcalls, self.func = wrap_function(func, args, _make_cache(cache))
+        self.iterations = 1
+        self.adaptive = adaptive
+        self.restart = restart
+        self.restarts = 0
+        self._frestart = None
+        if x0 is not None:
+            self.set_simplex(x0)
+
+    def set_simplex(self, x0):
+        """Build and evaluate the initial simplex around x0, or use the
+        (N+1,N) simplex x0 as given."""
+        func = self.func
+        x0 = asfarray(x0)
+        if x0.ndim == 2:
+            sim = x0.copy()
+            if sim.shape[0] != sim.shape[1]+1:
+                raise ValueError("Initial simplex must have N+1 vertices.")
+        else:
+            x0 = x0.flatten()
+            N = len(x0)
+            sim = numpy.zeros((N+1,N), dtype=x0.dtype)
+            sim[0] = x0
+            for k in range(0,N):
+                y = numpy.array(x0,copy=True)
+                if y[k] != 0:
+                    y[k] = (1+self.nonzdelt)*y[k]
+                else:
+                    y[k] = self.zdelt
+                sim[k+1] = y
+        fsim = numpy.zeros((len(sim),), float)
+        for k in range(len(sim)):
+            fsim[k] = func(sim[k])
+
+        ind = numpy.argsort(fsim)
+        fsim = numpy.take(fsim,ind,0)
+        # sort so sim[0,:] has the lowest function value
+        sim = numpy.take(sim,ind,0)
+        self.sim, self.fsim = sim, fsim
+        if self.adaptive:
+            self.set_coefficients(sim.shape[1])
+
+    def set_coefficients(self, N):
+        """Use the dimension dependent coefficients of the adaptive mode."""
+        self.rho = 1
+        self.chi = 1 + 2./N
+        self.psi = 0.75 - 1./(2*N)
+        self.sigma = 1 - 1./N
+
+    def converged(self):
+        fsim = self.fsim
+        return (self.diameter() <= self.xtol
+                and max(abs(fsim[0]-fsim[1:])) <= self.ftol)
+
+    def degenerate(self):
+        """
+        True if the simplex has collapsed toward a lower dimensional
+        subspace, that is, if the condition number of its edges from the
+        best vertex, each scaled to unit length, exceeds degenerate_tol.
+        This costs the singular values of an N by N matrix, so `finished`
+        only calls it after a step which can flatten the simplex.
+        """
+        edges = self.sim[1:] - self.sim[0]
+        length = sqrt(numpy.sum(edges**2, axis=1))
+        if (length == 0).any():
+            return True
+        s = numpy.linalg.svd(edges/length[:,None], compute_uv=False)
+        return s[0] > self.degenerate_tol*s[-1]
+
+    def finished(self):
+        """
+        True if the search should stop.  With restarts enabled, a degenerate
+        simplex is rebuilt around its best vertex, and so is a converged
+        one unless the minimum has not improved since the last restart.
+        Reflections keep the volume of the simplex and expansions grow it,
+        so the SVD in `degenerate` is only done after a contraction or
+        shrink step.
+        """
+        if not self.restart:
+            return self.converged()
+        if self.converged():
+            if (self._frestart is not None
+                and self.fsim[0] >= self._frestart - self.ftol):
+                return True
+        elif (getattr(self, 'last_step', None) in ('reflect', 'expand')
+              or not self.degenerate()):
+            return False
+        self._frestart = self.fsim[0]
+        self.rebuild()
+        return False
+
+    def rebuild(self):
+        """Start a new simplex around the best vertex, as for `set_simplex`."""
+        x0, f0 = self.sim[0].copy(), self.fsim[0]
+        N = len(x0)
+        sim = numpy.repeat(x0[None,:], N+1, axis=0)
+        fsim = numpy.zeros(N+1, float)
+        fsim[0] = f0
+        for k in range(N):
+            if x0[k] != 0:
+                sim[k+1,k] = (1+self.nonzdelt)*x0[k]
+            else:
+                sim[k+1,k] = self.zdelt
+            fsim[k+1] = self.func(sim[k+1])
+        ind = numpy.argsort(fsim)
+        self.sim = numpy.take(sim,ind,0)
+        self.fsim = numpy.take(fsim,ind,0)
+        self.restarts += 1
+        self.last_step = 'restart'
+
+    def step(self):
+        """Take one reflect, expand, contract or shrink step."""
+        func = self.func
+        sim, fsim = self.sim, self.fsim
+        rho, chi, psi, sigma = self.rho, self.chi, self.psi, self.sigma
+        N = sim.shape[1]
+
+        xbar = numpy.add.reduce(sim[:-1],0) / N
+        xr = (1+rho)*xbar - rho*sim[-1]
+        fxr = func(xr)
+        doshrink = 0
+        step = 'reflect'
+
+        if fxr < fsim[0]:
+            xe = (1+rho*chi)*xbar - rho*chi*sim[-1]
+            fxe = func(xe)
+
+            if fxe < fxr:
+                sim[-1] = xe
+                fsim[-1] = fxe
+                step = 'expand'
+            else:
+                sim[-1] = xr
+                fsim[-1] = fxr
+        else: # fsim[0] <= fxr
+            if fxr < fsim[-2]:
+                sim[-1] = xr
+                fsim[-1] = fxr
+            else: # fxr >= fsim[-2]
+                # Perform contraction
+                if fxr < fsim[-1]:
+                    xc = (1+psi*rho)*xbar - psi*rho*sim[-1]
+                    fxc = func(xc)
+
+                    step = 'contract'
+                    if fxc <= fxr:
+                        sim[-1] = xc
+                        fsim[-1] = fxc
+                    else:
+                        doshrink=1
+                else:
+                    # Perform an inside contraction
+                    xcc = (1-psi)*xbar + psi*sim[-1]
+                    fxcc = func(xcc)
+                    step = 'inside'
+
+                    if fxcc < fsim[-1]:
+                        sim[-1] = xcc
+                        fsim[-1] = fxcc
+                    else:
+                        doshrink = 1
+
+                if doshrink:
+                    step = 'shrink'
+                    for j in range(1,N+1):
+                        sim[j] = sim[0] + sigma*(sim[j] - sim[0])
+                        fsim[j] = func(sim[j])
+
+        ind = numpy.argsort(fsim)
+        self.sim = numpy.take(sim,ind,0)
+        self.fsim = numpy.take(fsim,ind,0)
+        self.iterations += 1
+        self.last_step = step
+
+    def diameter(self):
+        """Largest distance of a simplex vertex from the best vertex."""
+        return max(numpy.ravel(abs(self.sim[1:]-self.sim[0])))
+
+    def run(self, maxiter=None, maxfun=None):
+        """
+        Iterate until converged or until the total number of iterations
+        or function calls reaches *maxiter* or *maxfun* (default N*200).
+
+        Returns the warnflag as in `fmin`.
+        """
+        N = self.sim.shape[1]
+        if maxiter is None:
+            maxiter = N * 200
+        if maxfun is None:
+            maxfun = N * 200
+        while (self.fcalls[0] < maxfun and self.iterations < maxiter):
+            if self.finished():
+                break
+            self.step()
+        return self.warnflag(maxiter, maxfun)
+
+    def warnflag(self, maxiter, maxfun):
+        if self.fcalls[0] >= maxfun:
+            return 1
+        elif self.iterations >= maxiter:
+            return 2
+        else:
+            return 0
+
+    def state(self):
+        state = dict(method='NelderMead',
+                     sim=self.sim.copy(), fsim=self.fsim.copy(),
+                     iterations=self.iterations, funcalls=self.fcalls[0],
+                     xtol=self.xtol, ftol=self.ftol,
+                     adaptive=self.adaptive, restart=self.restart,
+                     restarts=self.restarts)
+        if self._frestart is not None:
+            state['frestart'] = self._frestart
+        return state
+
+    @classmethod
+    def from_state(cls, func, state, args=(), cache=None):
+        """Rebuild an optimizer for func from the result of `state`."""
+        if str(state['method']) != 'NelderMead':
+            raise ValueError("state is for %s, not NelderMead"
+                             % state['method'])
+        opt = cls(func, None, args=args, xtol=float(state['xtol']),
+                  ftol=float(state['ftol']), cache=cache)
+        opt.sim = asfarray(state['sim']).copy()
+        opt.fsim = asfarray(state['fsim']).copy()
+        opt.iterations = int(state['iterations'])
+        opt.fcalls[0] = int(state['funcalls'])
+        # States saved before the adaptive and restart options lack them.
+        keys = list(state.keys())
+        if 'adaptive' in keys and bool(state['adaptive']):
+            opt.adaptive = True
+            opt.set_coefficients(opt.sim.shape[1])
+        if 'restart' in keys:
+            opt.restart = bool(state['restart'])
+            opt.restarts = int(state['restarts'])
+        if 'frestart' in keys:
+            opt._frestart = float(state['frestart'])
+        return opt
+
+    def get_result(self, full_output=False):
+        if full_output:
+            return self.sim[0], self.fsim[0], self.iterations, self.fcalls[0]
+        else:
+            return self.sim[0]
+
+
 def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
-         full_output=0, disp=1, retall=0, callback=None):
+         full_output=0, disp=1, retall=0, callback=None, cache=None,
+         trace=None, bounds=None, adaptive=False, restart=False,
+         budget=None):
     """
     Minimize a function using the downhill simplex algorithm.
 
@@ -205,8 +921,11 @@ def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
     warnflag : int
         1 : Maximum number of function evaluations made.
         2 : Maximum number of iterations reached.
+        3 : Budget exhausted; xopt is the best point evaluated.
     allvecs : list
         Solution at each iteration.
+    cachestats : tuple
+        Cache (hits, misses), if a cache is used.
 
     Other parameters
     ----------------
@@ -224,6 +943,28 @@ def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
         Set to True to print convergence messages.
     retall : bool
         Set to True to return list of solutions at each iteration.
+    cache : int or FunctionCache
+        Size of the cache of previously evaluated points, or an existing
+        `FunctionCache` to share with other fits of the same function.
+        Function calls still count cache hits.
+    trace : Trace
+        Record the progress of each iteration in trace.
+    bounds : sequence
+        (lower, upper) pair for each parameter, using None for no limit.
+        The simplex moves in transformed parameters which always map
+        into the box, so func is never called outside the bounds.  The
+        initial guess is clipped to the box, and xtol and a shared cache
+        apply to the transformed parameters.
+    adaptive : bool
+        Scale the simplex coefficients with the number of parameters,
+        which helps for more than about 10 parameters (see `NelderMead`).
+    restart : bool
+        Rebuild the simplex around the best point when it converges or
+        degenerates, and stop once a restart no longer improves the
+        minimum.  Restarts are recorded in trace with step 'restart'.
+    budget : Budget
+        Limit on wall time and function calls, possibly shared with other
+        minimizers.  Only evaluations of func are charged, not cache hits.
 
     Notes
     -----
@@ -231,122 +972,77 @@ def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
     one or more variables.
 
     """
-    fcalls, func = wrap_function(func, args)
+    cache = _make_cache(cache)
+    if trace is not None:
+        func = trace.timed(func)
     x0 = asfarray(x0).flatten()
     N = len(x0)
-    rank = len(x0.shape)
-    if not -1 < rank < 2:
-        raise ValueError("Initial guess must be a scalar or rank-1 sequence.")
+    if bounds is not None:
+        box = _BoxTransform(bounds, N)
+        x0 = box.clip(x0)
+        func, start = (_BoundedFunction(func, box),
+                       box.simplex(x0, NelderMead.nonzdelt, NelderMead.zdelt))
+        external = box.to_external
+    else:
+        start, external = x0, lambda x: x
+    if budget is not None:
+        func = _BudgetFunction(func, budget)
     if maxiter is None:
         maxiter = N * 200
     if maxfun is None:
         maxfun = N * 200
 
-    rho = 1; chi = 2; psi = 0.5; sigma = 0.5;
-    one2np1 = range(1,N+1)
-
-    if rank == 0:
-        sim = numpy.zeros((N+1,), dtype=x0.dtype)
-    else:
-        sim = numpy.zeros((N+1,N), dtype=x0.dtype)
-    fsim = numpy.zeros((N+1,), float)
-    sim[0] = x0
     if retall:
-        allvecs = [sim[0]]
-    fsim[0] = func(x0)
-    nonzdelt = 0.05
-    zdelt = 0.00025
-    for k in range(0,N):
-        y = numpy.array(x0,copy=True)
-        if y[k] != 0:
-            y[k] = (1+nonzdelt)*y[k]
+        allvecs = [x0]
+
+    opt = None
+    try:
+        opt = NelderMead(func, start, args=args, xtol=xtol, ftol=ftol,
+                         cache=cache, adaptive=adaptive, restart=restart)
+        fcalls = opt.fcalls
+        while (fcalls[0] < maxfun and opt.iterations < maxiter):
+            restarts = opt.restarts
+            if opt.finished():
+                break
+            if opt.restarts > restarts and trace is not None:
+                trace.record(opt.iterations, fcalls[0], opt.fsim[0],
+                             opt.diameter(), 'restart')
+            opt.step()
+            if trace is not None:
+                trace.record(opt.iterations, fcalls[0], opt.fsim[0],
+                             opt.diameter(), opt.last_step)
+            if callback is not None:
+                callback(external(opt.sim[0]))
+            if retall:
+                allvecs.append(external(opt.sim[0]))
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        # Keep the best point evaluated, which may be from a partial step.
+        if opt is None:
+            x, fval = func.best()
+            fcalls, iterations = [func.ncalls], 0
         else:
-            y[k] = zdelt
-
-        sim[k+1] = y
-        f = func(y)
-        fsim[k+1] = f
-
-    ind = numpy.argsort(fsim)
-    fsim = numpy.take(fsim,ind,0)
-    # sort so sim[0,:] has the lowest function value
-    sim = numpy.take(sim,ind,0)
-
-    iterations = 1
-
-    while (fcalls[0] < maxfun and iterations < maxiter):
-        if (max(numpy.ravel(abs(sim[1:]-sim[0]))) <= xtol \
-            and max(abs(fsim[0]-fsim[1:])) <= ftol):
-            break
-
-        xbar = numpy.add.reduce(sim[:-1],0) / N
-        xr = (1+rho)*xbar - rho*sim[-1]
-        fxr = func(xr)
-        doshrink = 0
-
-        if fxr < fsim[0]:
-            xe = (1+rho*chi)*xbar - rho*chi*sim[-1]
-            fxe = func(xe)
-
-            if fxe < fxr:
-                sim[-1] = xe
-                fsim[-1] = fxe
-            else:
-                sim[-1] = xr
-                fsim[-1] = fxr
-        else: # fsim[0] <= fxr
-            if fxr < fsim[-2]:
-                sim[-1] = xr
-                fsim[-1] = fxr
-            else: # fxr >= fsim[-2]
-                # Perform contraction
-                if fxr < fsim[-1]:
-                    xc = (1+psi*rho)*xbar - psi*rho*sim[-1]
-                    fxc = func(xc)
-
-                    if fxc <= fxr:
-                        sim[-1] = xc
-                        fsim[-1] = fxc
-                    else:
-                        doshrink=1
-                else:
-                    # Perform an inside contraction
-                    xcc = (1-psi)*xbar + psi*sim[-1]
-                    fxcc = func(xcc)
-
-                    if fxcc < fsim[-1]:
-                        sim[-1] = xcc
-                        fsim[-1] = fxcc
-                    else:
-                        doshrink = 1
-
-                if doshrink:
-                    for j in one2np1:
-                        sim[j] = sim[0] + sigma*(sim[j] - sim[0])
-                        fsim[j] = func(sim[j])
-
-        ind = numpy.argsort(fsim)
-        sim = numpy.take(sim,ind,0)
-        fsim = numpy.take(fsim,ind,0)
-        if callback is not None:
-            callback(sim[0])
-        iterations += 1
-        if retall:
-            allvecs.append(sim[0])
-
-    x = sim[0]
-    fval = min(fsim)
-    warnflag = 0
+            x, fval = func.best(opt.sim[0], opt.fsim[0])
+            fcalls, iterations = opt.fcalls, opt.iterations
+        x = x0 if x is None else external(x)
+        warnflag = 3
+    else:
+        x = external(opt.sim[0])
+        fval = min(opt.fsim)
+        iterations = opt.iterations
+        warnflag = opt.warnflag(maxiter, maxfun)
 
-    if fcalls[0] >= maxfun:
-        warnflag = 1
+    if warnflag == 1:
         if disp:
             print "Warning: Maximum number of function evaluations has "\
                   "been exceeded."
-    elif iterations >= maxiter:
-        warnflag = 2
+    elif warnflag == 2:
         if disp:
             print "Warning: Maximum number of iterations has been exceeded"
+    elif warnflag == 3:
+        if disp:
+            print "Warning: Budget exhausted; returning the best point so far."
     else:
         if disp:
             print "Optimization terminated successfully."
@@ -359,6 +1055,8 @@ def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
         retlist = x, fval, iterations, fcalls[0], warnflag
         if retall:
             retlist += (allvecs,)
+        if cache is not None:
+            retlist += (cache.stats(),)
     else:
         retlist = x
         if retall:
@@ -367,79 +1065,534 @@ def fmin(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None, maxfun=None,
     return retlist
 
 
-def approx_fprime(xk,f,epsilon,*args):
-    f0 = f(*((xk,)+args))
-    grad = numpy.zeros((len(xk),), float)
-    ei = numpy.zeros((len(xk),), float)
-    for k in range(len(xk)):
-        ei[k] = epsilon
-        grad[k] = (f(*((xk+ei,)+args)) - f0)/epsilon
-        ei[k] = 0.0
-    return grad
-
-def check_grad(func, grad, x0, *args):
-    return sqrt(sum((grad(x0,*args)-approx_fprime(x0,func,_epsilon,*args))**2))
-
-def approx_fhess_p(x0,p,fprime,epsilon,*args):
-    f2 = fprime(*((x0+epsilon*p,)+args))
-    f1 = fprime(*((x0,)+args))
-    return (f2 - f1)/epsilon
-
-
-def fminbound(func, x1, x2, args=(), xtol=1e-5, maxfun=500,
-              full_output=0, disp=1):
-    """Bounded minimization for scalar functions.
+def fmin_multistart(func, starts, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
+                    maxfun=None, full_output=0, disp=1, cache=None,
+                    bounds=None, adaptive=False, restart=False, budget=None,
+                    rung=None, eta=2):
+    """
+    Minimize a function using downhill simplex from several starting
+    points, racing the starts against each other.
 
     Parameters
     ----------
-    func : callable f(x,*args)
-        Objective function to be minimized (must accept and return scalars).
-    x1, x2 : float or array scalar
-        The optimization bounds.
+    func : callable func(x,*args)
+        The objective function to be minimized.
+    starts : sequence
+        Initial guesses, one for each start.
     args : tuple
-        Extra arguments passed to function.
-    xtol : float
-        The convergence tolerance.
-    maxfun : int
-        Maximum number of function evaluations allowed.
-    full_output : bool
-        If True, return optional outputs.
-    disp : int
-        If non-zero, print messages.
-            0 : no message printing.
-            1 : non-convergence notification messages only.
-            2 : print a message on convergence too.
-            3 : print iteration results.
-
+        Extra arguments passed to func, i.e. ``f(x,*args)``.
 
     Returns
     -------
     xopt : ndarray
-        Parameters (over given interval) which minimize the
-        objective function.
-    fval : number
-        The function value at the minimum point.
-    ierr : int
-        An error flag (0 if converged, 1 if maximum number of
-        function calls reached).
-    numfunc : int
-      The number of function calls made.
+        Parameter that minimizes function.
+    fopt : float
+        Value of function at minimum: ``fopt = func(xopt)``.
+    iter : int
+        Number of iterations performed, summed over the starts.
+    funcalls : int
+        Number of function calls made, summed over the starts.
+    warnflag : int
+        Warning flag of the winning start, as for `fmin`.
+    cachestats : tuple
+        Cache (hits, misses), if a cache is used.
+
+    Other parameters
+    ----------------
+    xtol, ftol, maxiter, maxfun, full_output, disp, cache, bounds
+        As for `fmin`, with maxiter and maxfun applied to each start.
+        Sharing a cache between the starts is useful since the starts
+        often visit the same points once they are in the same basin.
+    adaptive, restart, budget
+        As for `fmin`.
+    rung : int
+        Number of iterations for each start in the first round (default
+        5*N).  Each later round is *eta* times longer.
+    eta : int
+        Keep the best 1/eta of the remaining starts after each round.
 
     Notes
     -----
-    Finds a local minimizer of the scalar function `func` in the
-    interval x1 < xopt < x2 using Brent's method.  (See `brent`
-    for auto-bracketing).
+    The starts take turns, advancing by *rung* iterations each round.
+    After each round, a start whose best vertex lies within the extent of
+    the simplex of a better start is dropped as being in the same basin,
+    and only the best ceil(K/eta) of the remaining K starts continue.
+    Once a single start remains it runs to convergence, so the cost is
+    that of one fit plus the early rounds of the losing starts.  A start
+    which descends slowly toward a better minimum can lose the race.
 
     """
-    # Test bounds are of correct form
+    cache = _make_cache(cache)
+    starts = [asfarray(x0).flatten() for x0 in starts]
+    N = len(starts[0])
+    if bounds is not None:
+        box = _BoxTransform(bounds, N)
+        starts = [box.clip(x0) for x0 in starts]
+        func, simplices = _BoundedFunction(func, box), \
+            [box.simplex(x0, NelderMead.nonzdelt, NelderMead.zdelt)
+             for x0 in starts]
+        external = box.to_external
+    else:
+        simplices, external = starts, lambda x: x
+    if budget is not None:
+        func = _BudgetFunction(func, budget)
+    if maxiter is None:
+        maxiter = N * 200
+    if maxfun is None:
+        maxfun = N * 200
+    if rung is None:
+        rung = 5 * N
+
+    def stopped(opt):
+        return (opt.fcalls[0] >= maxfun or opt.iterations >= maxiter
+                or opt.finished())
+
+    opts = []
+    try:
+        for x0 in simplices:
+            opts.append(NelderMead(func, x0, args=args, xtol=xtol, ftol=ftol,
+                                   cache=cache, adaptive=adaptive,
+                                   restart=restart))
+        race = list(opts)
+        while len(race) > 1:
+            for opt in race:
+                for _ in range(rung):
+                    if stopped(opt):
+                        break
+                    opt.step()
+            race = _multistart_survivors(race, eta)
+            rung *= eta
+        winner = race[0]
+        while not stopped(winner):
+            winner.step()
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        # Keep the best point evaluated, which may be from a partial step.
+        x, fval = func.best()
+        for opt in opts:
+            if opt.fsim[0] < fval:
+                x, fval = opt.sim[0], opt.fsim[0]
+        x = starts[0] if x is None else external(x)
+        warnflag = 3
+    else:
+        x, fval = external(winner.sim[0]), winner.fsim[0]
+        warnflag = winner.warnflag(maxiter, maxfun)
+    iterations = sum(opt.iterations for opt in opts)
+    funcalls = sum(opt.fcalls[0] for opt in opts)
+    if budget is not None and len(opts) < len(starts):
+        funcalls = func.ncalls
+
+    if warnflag == 1:
+        if disp:
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded."
+    elif warnflag == 2:
+        if disp:
+            print "Warning: Maximum number of iterations has been exceeded"
+    elif warnflag == 3:
+        if disp:
+            print "Warning: Budget exhausted; returning the best point so far."
+    else:
+        if disp:
+            print "Optimization terminated successfully."
+            print "         Current function value: %f" % fval
+            print "         Iterations: %d" % iterations
+            print "         Function evaluations: %d" % funcalls
 
-    if not (is_array_scalar(x1) and is_array_scalar(x2)):
+    if full_output:
+        retlist = x, fval, iterations, funcalls, warnflag
+        if cache is not None:
+            retlist += (cache.stats(),)
+    else:
+        retlist = x
+
+    return retlist
+
+def _multistart_survivors(race, eta):
+    """
+    Rank the simplex optimizers in race by their best value, drop those
+    in the same basin as a better one, and keep the best 1/eta.
+    """
+    race = sorted(race, key=lambda opt: opt.fsim[0])
+    kept = []
+    for opt in race:
+        extent = numpy.max(abs(opt.sim - opt.sim[0]), axis=0)
+        for best in kept:
+            span = extent + numpy.max(abs(best.sim - best.sim[0]), axis=0)
+            if numpy.all(abs(opt.sim[0] - best.sim[0]) <= span):
+                break
+        else:
+            kept.append(opt)
+    return kept[:pymax(1, -(-len(kept)//eta))]
+
+
+def fmin_batch(func_batch, X0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
+               maxfun=None, full_output=0, disp=1, callback=None,
+               indexed=False):
+    """
+    Minimize many independent problems using lockstep downhill simplex.
+
+    Parameters
+    ----------
+    func_batch : callable func_batch(P,*args)
+        Vectorized objective.  Given an (M,N) array of parameter vectors
+        it returns the M corresponding costs.  If `indexed` is True it
+        is called as ``func_batch(P,idx,*args)``, where ``idx[i]`` is the
+        problem number (row of `X0`) that ``P[i]`` belongs to.
+    X0 : ndarray
+        Initial guesses, one row for each of the K problems.
+    args : tuple
+        Extra arguments passed to func_batch.
+    callback : callable
+        Called after each iteration, as callback(xk), where xk is the
+        (K,N) array of current best parameter vectors.
+    indexed : bool
+        Set to True if func_batch needs the problem number for each row,
+        e.g., because each problem has its own data set.
+
+    Returns
+    -------
+    xopt : ndarray
+        (K,N) parameters that minimize each problem.
+    fopt : ndarray
+        Value of function at minimum for each problem.
+    iter : ndarray
+        Number of iterations performed for each problem.
+    funcalls : ndarray
+        Number of function evaluations used by each problem.
+    warnflag : ndarray
+        0 : Converged.
+        1 : Maximum number of function evaluations made.
+        2 : Maximum number of iterations reached.
+
+    Other parameters
+    ----------------
+    xtol, ftol, maxiter, maxfun, full_output, disp
+        As for `fmin`, but applied to each problem separately.
+
+    Notes
+    -----
+    Each problem follows the same sequence of reflect, expand, contract
+    and shrink steps as `fmin`, but all problems take their step together
+    so that each stage needs only one call to `func_batch`.  Problems
+    which have converged or run out of iterations are dropped from the
+    active set and are no longer evaluated.
+
+    """
+    X0 = asfarray(X0)
+    if X0.ndim != 2:
+        raise ValueError("Initial guesses must be a rank-2 array of "
+                         "K problems by N parameters.")
+    K,N = X0.shape
+    if maxiter is None:
+        maxiter = N * 200
+    if maxfun is None:
+        maxfun = N * 200
+
+    rho = 1; chi = 2; psi = 0.5; sigma = 0.5;
+
+    fcalls = numpy.zeros(K, int)
+    def func(P, idx):
+        fcalls[:] += numpy.bincount(idx, minlength=K)
+        if indexed:
+            F = func_batch(P, idx, *args)
+        else:
+            F = func_batch(P, *args)
+        return asarray(F, dtype=float).reshape(len(idx))
+
+    # Initial simplex for every problem, built as in fmin.
+    nonzdelt = 0.05
+    zdelt = 0.00025
+    sim = numpy.repeat(X0[:,None,:], N+1, axis=1)
+    step = sim[:,1:,:]
+    diag = numpy.arange(N)
+    y = step[:,diag,diag]
+    step[:,diag,diag] = numpy.where(y != 0, (1+nonzdelt)*y, zdelt)
+    allidx = numpy.arange(K)
+    fsim = func(sim.reshape(K*(N+1),N),
+                numpy.repeat(allidx, N+1)).reshape(K,N+1)
+
+    rows = allidx[:,None]
+    ind = numpy.argsort(fsim, axis=1)
+    fsim = fsim[rows,ind]
+    sim = sim[rows,ind]
+
+    iterations = numpy.ones(K, int)
+    active = allidx
+    while True:
+        S, F = sim[active], fsim[active]
+        done = ((abs(S[:,1:]-S[:,:1]).reshape(len(active),-1).max(axis=1)
+                 <= xtol)
+                & (abs(F[:,:1]-F[:,1:]).max(axis=1) <= ftol))
+        done |= (fcalls[active] >= maxfun) | (iterations[active] >= maxiter)
+        active, S, F = active[~done], S[~done], F[~done]
+        if len(active) == 0:
+            break
+
+        xbar = numpy.add.reduce(S[:,:-1],1) / N
+        worst = S[:,-1]
+        xr = (1+rho)*xbar - rho*worst
+        fxr = func(xr, active)
+        xnew, fnew = xr.copy(), fxr.copy()
+
+        # Expand if the reflection is the new best point.
+        expand = fxr < F[:,0]
+        if expand.any():
+            xe = (1+rho*chi)*xbar[expand] - rho*chi*worst[expand]
+            fxe = func(xe, active[expand])
+            better = fxe < fxr[expand]
+            sel = numpy.nonzero(expand)[0][better]
+            xnew[sel], fnew[sel] = xe[better], fxe[better]
+
+        # Contract if the reflection is no better than the second worst,
+        # outside if it improves on the worst, otherwise inside.
+        contract = ~expand & (fxr >= F[:,-2])
+        doshrink = numpy.zeros(len(active), bool)
+        if contract.any():
+            outside = (fxr < F[:,-1])[contract]
+            xb, xw = xbar[contract], worst[contract]
+            xc = numpy.where(outside[:,None],
+                             (1+psi*rho)*xb - psi*rho*xw,
+                             (1-psi)*xb + psi*xw)
+            fxc = func(xc, active[contract])
+            accept = numpy.where(outside, fxc <= fxr[contract],
+                                 fxc < F[contract,-1])
+            sel = numpy.nonzero(contract)[0]
+            xnew[sel[accept]], fnew[sel[accept]] = xc[accept], fxc[accept]
+            doshrink[sel[~accept]] = True
+
+        keep = ~doshrink
+        S[keep,-1], F[keep,-1] = xnew[keep], fnew[keep]
+        if doshrink.any():
+            Ss = S[doshrink]
+            Ss[:,1:] = Ss[:,:1] + sigma*(Ss[:,1:] - Ss[:,:1])
+            ns = len(Ss)
+            fs = func(Ss[:,1:].reshape(ns*N,N),
+                      numpy.repeat(active[doshrink], N))
+            S[doshrink] = Ss
+            F[doshrink,1:] = fs.reshape(ns,N)
+
+        rows = numpy.arange(len(active))[:,None]
+        ind = numpy.argsort(F, axis=1)
+        sim[active], fsim[active] = S[rows,ind], F[rows,ind]
+        iterations[active] += 1
+        if callback is not None:
+            callback(sim[:,0])
+
+    x = sim[:,0]
+    fval = fsim[:,0]
+    warnflag = numpy.where(fcalls >= maxfun, 1,
+                           numpy.where(iterations >= maxiter, 2, 0))
+
+    if disp:
+        print "Optimization terminated successfully for %d of %d problems." \
+              % (numpy.sum(warnflag == 0), K)
+        if (warnflag == 1).any():
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded for %d problems." % numpy.sum(warnflag == 1)
+        if (warnflag == 2).any():
+            print "Warning: Maximum number of iterations has been "\
+                  "exceeded for %d problems." % numpy.sum(warnflag == 2)
+        print "         Function evaluations: %d" % numpy.sum(fcalls)
+
+    if full_output:
+        return x, fval, iterations, fcalls, warnflag
+    else:
+        return x
+
+
+class _PointFunction:
+    """Picklable func(x,*args) for use with a process pool map."""
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+    def __call__(self, x):
+        return self.func(x, *self.args)
+
+def _evaluate_points(func, X, args, vectorized, mapper):
+    """Evaluate func at each row of X, as a block or through mapper."""
+    if vectorized:
+        return asarray(func(X, *args))
+    elif mapper is not None:
+        return asarray(mapper(_PointFunction(func, args), list(X)))
+    else:
+        return asarray([func(x, *args) for x in X])
+
+_DEFAULT_STEP = {
+    'forward': _epsilon,
+    'central': numpy.finfo(float).eps**(1/3.),
+    'complex': 1e-20,
+    }
+def approx_grad(func, xk, args=(), epsilon=None, method='forward',
+                vectorized=False, mapper=None):
+    """
+    Finite difference approximation to the gradient of a scalar function.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Function whose gradient is wanted.
+    xk : ndarray
+        Point at which to evaluate the gradient.
+    args : tuple
+        Extra arguments passed to func.
+    epsilon : float or ndarray
+        Step size for each parameter.  The default depends on *method*.
+    method : string
+        'forward' uses N+1 evaluations, 'central' uses 2N evaluations
+        with error O(epsilon**2), and 'complex' uses N evaluations at
+        complex points ``xk + 1j*epsilon*e_k``.  The complex step is exact
+        to machine precision but requires func to be analytic and to
+        accept complex parameters.
+    vectorized : bool
+        If True, func is called once with the (M,N) array of all
+        perturbed points and returns M values.
+    mapper : callable map(f, points)
+        Map function, such as ``multiprocessing.Pool().map``, used to
+        evaluate the perturbed points when func is not vectorized.
+
+    Returns
+    -------
+    grad : ndarray
+        Approximate gradient of func at xk.  If func returns a vector,
+        then grad[k] is the derivative of that vector with respect to
+        parameter k (see `approx_jacobian`).
+    """
+    xk = asfarray(xk)
+    N = len(xk)
+    if epsilon is None:
+        epsilon = _DEFAULT_STEP[method]
+    step = numpy.diag(numpy.ones(N)*epsilon)
+    h = numpy.diag(step)
+    def scaled(dF, h):
+        return dF/h.reshape((N,)+(1,)*(dF.ndim-1))
+    if method == 'forward':
+        X = numpy.vstack((xk, xk + step))
+        F = _evaluate_points(func, X, args, vectorized, mapper)
+        return scaled(F[1:] - F[0], h)
+    elif method == 'central':
+        X = numpy.vstack((xk + step, xk - step))
+        F = _evaluate_points(func, X, args, vectorized, mapper)
+        return scaled(F[:N] - F[N:], 2*h)
+    elif method == 'complex':
+        X = xk + 1j*step
+        F = _evaluate_points(func, X, args, vectorized, mapper)
+        return scaled(F.imag, h)
+    else:
+        raise ValueError("method must be forward, central or complex")
+
+def approx_jacobian(func, xk, args=(), epsilon=None, method='forward',
+                    vectorized=False, mapper=None):
+    """
+    Finite difference approximation to the (M,N) Jacobian of a function
+    returning M values.  See `approx_grad` for parameters.
+    """
+    J = approx_grad(func, xk, args=args, epsilon=epsilon, method=method,
+                    vectorized=vectorized, mapper=mapper)
+    return numpy.transpose(J)
+
+def approx_hess_p(fprime, xk, p, args=(), epsilon=None, method='forward',
+                  vectorized=False, mapper=None):
+    """
+    Finite difference approximation to the product of the Hessian with
+    the vector *p*, using differences of the gradient *fprime* along *p*.
+
+    The parameters are as for `approx_grad`, except that fprime returns
+    an N vector for each point (or an (M,N) array if *vectorized*).
+    """
+    xk = asfarray(xk)
+    p = asfarray(p)
+    if epsilon is None:
+        epsilon = _DEFAULT_STEP[method]
+    if method == 'forward':
+        X = numpy.vstack((xk + epsilon*p, xk))
+        G = _evaluate_points(fprime, X, args, vectorized, mapper)
+        return (G[0] - G[1])/epsilon
+    elif method == 'central':
+        X = numpy.vstack((xk + epsilon*p, xk - epsilon*p))
+        G = _evaluate_points(fprime, X, args, vectorized, mapper)
+        return (G[0] - G[1])/(2*epsilon)
+    elif method == 'complex':
+        X = (xk + 1j*epsilon*p)[None,:]
+        G = _evaluate_points(fprime, X, args, vectorized, mapper)
+        return G[0].imag/epsilon
+    else:
+        raise ValueError("method must be forward, central or complex")
+
+def approx_fprime(xk,f,epsilon,*args):
+    return approx_grad(f, xk, args=args, epsilon=epsilon)
+
+def check_grad(func, grad, x0, *args):
+    return sqrt(sum((grad(x0,*args)-approx_fprime(x0,func,_epsilon,*args))**2))
+
+def approx_fhess_p(x0,p,fprime,epsilon,*args):
+    return approx_hess_p(fprime, x0, p, args=args, epsilon=epsilon)
+
+
+def fminbound(func, x1, x2, args=(), xtol=1e-5, maxfun=500,
+              full_output=0, disp=1, trace=None, budget=None):
+    """Bounded minimization for scalar functions.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Objective function to be minimized (must accept and return scalars).
+    x1, x2 : float or array scalar
+        The optimization bounds.
+    args : tuple
+        Extra arguments passed to function.
+    xtol : float
+        The convergence tolerance.
+    maxfun : int
+        Maximum number of function evaluations allowed.
+    full_output : bool
+        If True, return optional outputs.
+    disp : int
+        If non-zero, print messages.
+            0 : no message printing.
+            1 : non-convergence notification messages only.
+            2 : print a message on convergence too.
+            3 : print iteration results.
+    trace : Trace
+        Record the progress of each iteration in trace.
+    budget : Budget
+        Limit on wall time and function calls, possibly shared with other
+        minimizers.
+
+
+    Returns
+    -------
+    xopt : ndarray
+        Parameters (over given interval) which minimize the
+        objective function.
+    fval : number
+        The function value at the minimum point.
+    ierr : int
+        An error flag (0 if converged, 1 if maximum number of
+        function calls reached, 3 if the budget ran out).
+    numfunc : int
+      The number of function calls made.
+
+    Notes
+    -----
+    Finds a local minimizer of the scalar function `func` in the
+    interval x1 < xopt < x2 using Brent's method.  (See `brent`
+    for auto-bracketing).
+
+    """
+    # Test bounds are of correct form
+
+    if not (is_array_scalar(x1) and is_array_scalar(x2)):
         raise ValueError("Optimisation bounds must be scalars"
                          " or array scalars.")
     if x1 > x2:
         raise ValueError("The lower bound exceeds the upper bound.")
 
+    if trace is not None:
+        func = trace.timed(func)
+    if budget is not None:
+        func = _BudgetFunction(func, budget)
     flag = 0
     header = ' Func-count     x          f(x)          Procedure'
     step='       initial'
@@ -451,98 +1604,107 @@ def fminbound(func, x1, x2, args=(), xtol=1e-5, maxfun=500,
     nfc, xf = fulc, fulc
     rat = e = 0.0
     x = xf
-    fx = func(x,*args)
-    num = 1
-    fmin_data = (1, xf, fx)
-
-    ffulc = fnfc = fx
-    xm = 0.5*(a+b)
-    tol1 = sqrt_eps*abs(xf) + xtol / 3.0
-    tol2 = 2.0*tol1
-
-    if disp > 2:
-        print (" ")
-        print (header)
-        print "%5.0f   %12.6g %12.6g %s" % (fmin_data + (step,))
+    try:
+        fx = func(x,*args)
+        num = 1
+        fmin_data = (1, xf, fx)
 
+        ffulc = fnfc = fx
+        xm = 0.5*(a+b)
+        tol1 = sqrt_eps*abs(xf) + xtol / 3.0
+        tol2 = 2.0*tol1
 
-    while ( abs(xf-xm) > (tol2 - 0.5*(b-a)) ):
-        golden = 1
-        # Check for parabolic fit
-        if abs(e) > tol1:
-            golden = 0
-            r = (xf-nfc)*(fx-ffulc)
-            q = (xf-fulc)*(fx-fnfc)
-            p = (xf-fulc)*q - (xf-nfc)*r
-            q = 2.0*(q-r)
-            if q > 0.0: p = -p
-            q = abs(q)
-            r = e
-            e = rat
-
-            # Check for acceptability of parabola
-            if ( (abs(p) < abs(0.5*q*r)) and (p > q*(a-xf)) and \
-                 (p < q*(b-xf))):
-                rat = (p+0.0) / q;
-                x = xf + rat
-                step = '       parabolic'
-
-                if ((x-a) < tol2) or ((b-x) < tol2):
-                    si = numpy.sign(xm-xf) + ((xm-xf)==0)
-                    rat = tol1*si
-            else:      # do a golden section step
-                golden = 1
-
-        if golden:  # Do a golden-section step
-            if xf >= xm:
-                e=a-xf
-            else:
-                e=b-xf
-            rat = golden_mean*e
-            step = '       golden'
-
-        si = numpy.sign(rat) + (rat == 0)
-        x = xf + si*max([abs(rat), tol1])
-        fu = func(x,*args)
-        num += 1
-        fmin_data = (num, x, fu)
         if disp > 2:
+            print (" ")
+            print (header)
             print "%5.0f   %12.6g %12.6g %s" % (fmin_data + (step,))
 
-        if fu <= fx:
-            if x >= xf:
-                a = xf
-            else:
-                b = xf
-            fulc, ffulc = nfc, fnfc
-            nfc, fnfc = xf, fx
-            xf, fx = x, fu
-        else:
-            if x < xf:
-                a = x
-            else:
-                b = x
-            if (fu <= fnfc) or (nfc == xf):
-                fulc, ffulc = nfc, fnfc
-                nfc, fnfc = x, fu
-            elif (fu <= ffulc) or (fulc == xf) or (fulc == nfc):
-                fulc, ffulc = x, fu
-
-        xm = 0.5*(a+b)
-        tol1 = sqrt_eps*abs(xf) + xtol/3.0
-        tol2 = 2.0*tol1
 
-        if num >= maxfun:
-            flag = 1
-            fval = fx
-            if disp > 0:
-                _endprint(x, flag, fval, maxfun, xtol, disp)
-            if full_output:
-                return xf, fval, flag, num
+        while ( abs(xf-xm) > (tol2 - 0.5*(b-a)) ):
+            golden = 1
+            # Check for parabolic fit
+            if abs(e) > tol1:
+                golden = 0
+                r = (xf-nfc)*(fx-ffulc)
+                q = (xf-fulc)*(fx-fnfc)
+                p = (xf-fulc)*q - (xf-nfc)*r
+                q = 2.0*(q-r)
+                if q > 0.0: p = -p
+                q = abs(q)
+                r = e
+                e = rat
+
+                # Check for acceptability of parabola
+                if ( (abs(p) < abs(0.5*q*r)) and (p > q*(a-xf)) and \
+                     (p < q*(b-xf))):
+                    rat = (p+0.0) / q;
+                    x = xf + rat
+                    step = '       parabolic'
+
+                    if ((x-a) < tol2) or ((b-x) < tol2):
+                        si = numpy.sign(xm-xf) + ((xm-xf)==0)
+                        rat = tol1*si
+                else:      # do a golden section step
+                    golden = 1
+
+            if golden:  # Do a golden-section step
+                if xf >= xm:
+                    e=a-xf
+                else:
+                    e=b-xf
+                rat = golden_mean*e
+                step = '       golden'
+
+            si = numpy.sign(rat) + (rat == 0)
+            x = xf + si*max([abs(rat), tol1])
+            fu = func(x,*args)
+            num += 1
+            fmin_data = (num, x, fu)
+            if disp > 2:
+                print "%5.0f   %12.6g %12.6g %s" % (fmin_data + (step,))
+
+            if fu <= fx:
+                if x >= xf:
+                    a = xf
+                else:
+                    b = xf
+                fulc, ffulc = nfc, fnfc
+                nfc, fnfc = xf, fx
+                xf, fx = x, fu
             else:
-                return xf
-
-    fval = fx
+                if x < xf:
+                    a = x
+                else:
+                    b = x
+                if (fu <= fnfc) or (nfc == xf):
+                    fulc, ffulc = nfc, fnfc
+                    nfc, fnfc = x, fu
+                elif (fu <= ffulc) or (fulc == xf) or (fulc == nfc):
+                    fulc, ffulc = x, fu
+
+            xm = 0.5*(a+b)
+            tol1 = sqrt_eps*abs(xf) + xtol/3.0
+            tol2 = 2.0*tol1
+            if trace is not None:
+                trace.record(num-1, num, fx, b-a, step.strip())
+
+            if num >= maxfun:
+                flag = 1
+                fval = fx
+                if disp > 0:
+                    _endprint(x, flag, fval, maxfun, xtol, disp)
+                if full_output:
+                    return xf, fval, flag, num
+                else:
+                    return xf
+        fval = fx
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        xf, fval = func.best()
+        if xf is None:
+            xf = fulc
+        flag, num = 3, func.ncalls
     if disp > 0:
         _endprint(x, flag, fval, maxfun, xtol, disp)
 
@@ -554,7 +1716,10 @@ def fminbound(func, x1, x2, args=(), xtol=1e-5, maxfun=500,
 class Brent:
     #need to rethink design of __init__
     def __init__(self, func, args=(), tol=1.48e-8, maxiter=500,
-                 full_output=0):
+                 full_output=0, trace=None):
+        self.trace = trace
+        if trace is not None:
+            func = trace.timed(func)
         self.func = func
         self.args = args
         self.tol = tol
@@ -606,7 +1771,8 @@ class Brent:
         _cg = self._cg
         #################################
         #BEGIN CORE ALGORITHM
-        #we are making NO CHANGES in this
+        #we are making NO CHANGES in this, apart from noting the step
+        #type and recording each iteration in the trace
         #################################
         x=w=v=xb
         fw=fv=fx=func(*((x,)+self.args))
@@ -624,6 +1790,7 @@ class Brent:
             if abs(x-xmid) < (tol2-0.5*(b-a)):  # check for convergence
                 xmin=x; fval=fx
                 break
+            step = 'golden'
             if (abs(deltax) <= tol1):
                 if (x>=xmid): deltax=a-x       # do a golden section step
                 else: deltax=b-x
@@ -640,6 +1807,7 @@ class Brent:
                 # check parabolic fit
                 if ((p > tmp2*(a-x)) and (p < tmp2*(b-x)) and (abs(p) < abs(0.5*tmp2*dx_temp))):
                     rat = p*1.0/tmp2        # if parabolic step is useful.
+                    step = 'parabolic'
                     u = x + rat
                     if ((u-a) < tol2 or (b-u) < tol2):
                         if xmid-x >= 0: rat = tol1
@@ -671,6 +1839,8 @@ class Brent:
                 fv=fw; fw=fx; fx=fu
 
             iter += 1
+            if self.trace is not None:
+                self.trace.record(iter, funcalls, fx, b-a, step)
         #################################
         #END CORE ALGORITHM
         #################################
@@ -687,7 +1857,8 @@ class Brent:
             return self.xmin
 
 
-def brent(func, args=(), brack=None, tol=1.48e-8, full_output=0, maxiter=500):
+def brent(func, args=(), brack=None, tol=1.48e-8, full_output=0, maxiter=500,
+          trace=None, budget=None):
     """Given a function of one-variable and a possible bracketing interval,
     return the minimum of the function isolated to a fractional precision of
     tol.
@@ -707,6 +1878,12 @@ def brent(func, args=(), brack=None, tol=1.48e-8, full_output=0, maxiter=500):
     full_output : bool
         If True, return all output args (xmin, fval, iter,
         funcalls).
+    trace : Trace
+        Record the progress of each iteration in trace.
+    budget : Budget
+        Limit on wall time and function calls, possibly shared with other
+        minimizers.  If it runs out, the best point evaluated is returned
+        and budget.exceeded is set.
 
     Returns
     -------
@@ -726,14 +1903,23 @@ def brent(func, args=(), brack=None, tol=1.48e-8, full_output=0, maxiter=500):
 
     """
 
+    if budget is not None:
+        func = _BudgetFunction(func, budget)
     brent = Brent(func=func, args=args, tol=tol,
-                  full_output=full_output, maxiter=maxiter)
+                  full_output=full_output, maxiter=maxiter, trace=trace)
     brent.set_bracket(brack)
-    brent.optimize()
+    try:
+        brent.optimize()
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        brent.xmin, brent.fval = func.best()
+        brent.funcalls = func.ncalls
     return brent.get_result(full_output=full_output)
 
 
-def golden(func, args=(), brack=None, tol=_epsilon, full_output=0):
+def golden(func, args=(), brack=None, tol=_epsilon, full_output=0,
+           trace=None):
     """ Given a function of one-variable and a possible bracketing interval,
     return the minimum of the function isolated to a fractional precision of
     tol.
@@ -754,6 +1940,8 @@ def golden(func, args=(), brack=None, tol=_epsilon, full_output=0):
         x tolerance stop criterion
     full_output : bool
         If True, return optional outputs.
+    trace : Trace
+        Record the progress of each iteration in trace.
 
     Notes
     -----
@@ -761,6 +1949,8 @@ def golden(func, args=(), brack=None, tol=_epsilon, full_output=0):
     interval.
 
     """
+    if trace is not None:
+        func = trace.timed(func)
     if brack is None:
         xa,xb,xc,fa,fb,fc,funcalls = bracket(func, args=args)
     elif len(brack) == 2:
@@ -791,6 +1981,7 @@ def golden(func, args=(), brack=None, tol=_epsilon, full_output=0):
     f1 = func(*((x1,)+args))
     f2 = func(*((x2,)+args))
     funcalls += 2
+    iter = 0
     while (abs(x3-x0) > tol*(abs(x1)+abs(x2))):
         if (f2 < f1):
             x0 = x1; x1 = x2; x2 = _gR*x1 + _gC*x3
@@ -799,6 +1990,9 @@ def golden(func, args=(), brack=None, tol=_epsilon, full_output=0):
             x3 = x2; x2 = x1; x1 = _gR*x2 + _gC*x0
             f2 = f1; f1 = func(*((x1,)+args))
         funcalls += 1
+        iter += 1
+        if trace is not None:
+            trace.record(iter, funcalls, pymin(f1,f2), abs(x3-x0), 'golden')
     if (f1 < f2):
         xmin = x1
         fval = f1
@@ -898,156 +2092,886 @@ def bracket(func, xa=0.0, xb=1.0, args=(), grow_limit=110.0, maxiter=1000):
 
 
 
-def _linesearch_powell(func, p, xi, tol=1e-3):
-    """Line-search algorithm using fminbound.
-
-    Find the minimium of the function ``func(x0+ alpha*direc)``.
-
-    """
-    def myfunc(alpha):
-        return func(p + alpha * xi)
-    alpha_min, fret, iter, num = brent(myfunc, full_output=1, tol=tol)
-    xi = alpha_min*xi
-    return squeeze(fret), p+xi, xi
+def _lane_function(func, args, indexed):
+    """Wrap a vectorized scalar objective as f(x,idx) for the active lanes."""
+    def f(x, idx):
+        if indexed:
+            F = func(x, idx, *args)
+        else:
+            F = func(x, *args)
+        return asarray(F, dtype=float).reshape(len(idx))
+    return f
 
+def _lanes(*values):
+    """Broadcast the per-problem starting values to float arrays."""
+    return [numpy.array(v, dtype=float)
+            for v in numpy.broadcast_arrays(*[atleast_1d(v) for v in values])]
 
-def fmin_powell(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
-                maxfun=None, full_output=0, disp=1, retall=0, callback=None,
-                direc=None):
-    """
-    Minimize a function using modified Powell's method.
+def bracket_batch(func, xa=0.0, xb=1.0, args=(), grow_limit=110.0,
+                  maxiter=1000, indexed=False):
+    """Bracket the minimum of many independent scalar problems at once.
 
     Parameters
     ----------
     func : callable f(x,*args)
-        Objective function to be minimized.
-    x0 : ndarray
-        Initial guess.
+        Vectorized objective.  Given an array of points, one per problem,
+        it returns the corresponding costs.  If `indexed` is True it is
+        called as ``f(x,idx,*args)``, where ``idx[i]`` is the problem
+        number that ``x[i]`` belongs to.
+    xa, xb : ndarray
+        Initial points for each problem.  Scalars are broadcast.
     args : tuple
-        Extra arguments passed to func.
-    callback : callable
-        An optional user-supplied function, called after each
-        iteration.  Called as ``callback(xk)``, where ``xk`` is the
-        current parameter vector.
-    direc : ndarray
-        Initial direction set.
+        Additional arguments (if present), passed to `func`.
+    grow_limit : float
+        Maximum grow limit.
+    maxiter : int
+        Maximum number of iterations to perform.
+    indexed : bool
+        Set to True if func needs the problem number for each point.
 
     Returns
     -------
-    xopt : ndarray
-        Parameter which minimizes `func`.
-    fopt : number
-        Value of function at minimum: ``fopt = func(xopt)``.
-    direc : ndarray
-        Current direction set.
-    iter : int
-        Number of iterations.
-    funcalls : int
-        Number of function calls made.
-    warnflag : int
-        Integer warning flag:
-            1 : Maximum number of function evaluations.
-            2 : Maximum number of iterations.
-    allvecs : list
-        List of solutions at each iteration.
-
-    Other Parameters
-    ----------------
-    xtol : float
-        Line-search error tolerance.
-    ftol : float
-        Relative error in ``func(xopt)`` acceptable for convergence.
-    maxiter : int
-        Maximum number of iterations to perform.
-    maxfun : int
-        Maximum number of function evaluations to make.
-    full_output : bool
-        If True, fopt, xi, direc, iter, funcalls, and
-        warnflag are returned.
-    disp : bool
-        If True, print convergence messages.
-    retall : bool
-        If True, return a list of the solution at each iteration.
+    xa, xb, xc : ndarray
+        Bracket for each problem.
+    fa, fb, fc : ndarray
+        Objective function values in bracket.
+    funcalls : ndarray
+        Number of function evaluations made for each problem.
 
     Notes
     -----
-    Uses a modification of Powell's method to find the minimum of
-    a function of N variables.
+    Each problem follows the same sequence of steps as `bracket`; all
+    problems which are still searching share each call to `func`.
 
     """
-    # we need to use a mutable object here that we can update in the
-    # wrapper function
-    fcalls, func = wrap_function(func, args)
-    x = asarray(x0).flatten()
-    if retall:
-        allvecs = [x]
-    N = len(x)
-    rank = len(x.shape)
-    if not -1 < rank < 2:
-        raise ValueError("Initial guess must be a scalar or rank-1 sequence.")
-    if maxiter is None:
-        maxiter = N * 1000
-    if maxfun is None:
-        maxfun = N * 1000
-
+    f = _lane_function(func, args, indexed)
+    _gold = 1.618034
+    _verysmall_num = 1e-21
+    xa, xb = _lanes(xa, xb)
+    K = len(xa)
+    allidx = numpy.arange(K)
+    fa, fb = f(xa, allidx), f(xb, allidx)
+    swap = fa < fb                     # Switch so fa > fb
+    xa, xb = numpy.where(swap, xb, xa), numpy.where(swap, xa, xb)
+    fa, fb = numpy.where(swap, fb, fa), numpy.where(swap, fa, fb)
+    xc = xb + _gold*(xb-xa)
+    fc = f(xc, allidx)
+    funcalls = numpy.ones(K, int)*3
+    iter = 0
+    olderr = numpy.seterr(all='ignore')
+    try:
+        while True:
+            act = numpy.nonzero(fc < fb)[0]
+            if len(act) == 0:
+                break
+            if iter > maxiter:
+                raise RuntimeError("Too many iterations.")
+            iter += 1
+            Xa, Xb, Xc, Fa, Fb, Fc = xa[act], xb[act], xc[act], \
+                                     fa[act], fb[act], fc[act]
+            tmp1 = (Xb - Xa)*(Fb-Fc)
+            tmp2 = (Xb - Xc)*(Fb-Fa)
+            val = tmp2-tmp1
+            denom = numpy.where(abs(val) < _verysmall_num,
+                                2.0*_verysmall_num, 2.0*val)
+            W = Xb - ((Xb-Xc)*tmp2-(Xb-Xa)*tmp1)/denom
+            Wlim = Xb + grow_limit*(Xc-Xb)
+            inside = (W-Xc)*(Xb-W) > 0.0
+            limit = ~inside & ((W-Wlim)*(Wlim-Xc) >= 0.0)
+            beyond = ~inside & ~limit & ((W-Wlim)*(Xc-W) > 0.0)
+            W = numpy.where(limit, Wlim,
+                            numpy.where(inside | beyond, W,
+                                        Xc + _gold*(Xc-Xb)))
+            Fw = f(W, act)
+            funcalls[act] += 1
+
+            # Minimum between xb and xc: either w or xc closes the bracket.
+            low = inside & (Fw < Fc)
+            high = inside & ~low & (Fw > Fb)
+            xa[act[low]], xb[act[low]] = Xb[low], W[low]
+            fa[act[low]], fb[act[low]] = Fb[low], Fw[low]
+            xc[act[high]], fc[act[high]] = W[high], Fw[high]
+
+            # Otherwise take a further golden step from xc.
+            regrow = inside & ~low & ~high
+            advance = beyond & (Fw < Fc)
+            Xb = numpy.where(advance, Xc, Xb)
+            Fb = numpy.where(advance, Fc, Fb)
+            Xc = numpy.where(advance, W, Xc)
+            Fc = numpy.where(advance, Fw, Fc)
+            more = regrow | advance
+            if more.any():
+                W[more] = Xc[more] + _gold*(Xc[more]-Xb[more])
+                Fw[more] = f(W[more], act[more])
+                funcalls[act[more]] += 1
+
+            shift = ~(low | high)
+            sel = act[shift]
+            xa[sel], xb[sel], xc[sel] = Xb[shift], Xc[shift], W[shift]
+            fa[sel], fb[sel], fc[sel] = Fb[shift], Fc[shift], Fw[shift]
+    finally:
+        numpy.seterr(**olderr)
+    return xa, xb, xc, fa, fb, fc, funcalls
 
-    if direc is None:
-        direc = eye(N, dtype=float)
+def _bracket_batch_info(f, brack, args, indexed):
+    """Starting bracket for each problem, as in Brent.get_bracket_info."""
+    if len(brack) == 2:
+        return bracket_batch(f, xa=brack[0], xb=brack[1], args=args,
+                             indexed=indexed)
+    elif len(brack) == 3:
+        xa, xb, xc = _lanes(*brack)
+        swap = xa > xc    # swap so xa < xc can be assumed
+        xa, xc = numpy.where(swap, xc, xa), numpy.where(swap, xa, xc)
+        assert ((xa < xb) & (xb < xc)).all(), "Not a bracketing interval."
+        g = _lane_function(f, args, indexed)
+        allidx = numpy.arange(len(xa))
+        fa, fb, fc = g(xa, allidx), g(xb, allidx), g(xc, allidx)
+        assert ((fb < fa) & (fb < fc)).all(), "Not a bracketing interval."
+        return xa, xb, xc, fa, fb, fc, numpy.ones(len(xa), int)*3
     else:
-        direc = asarray(direc, dtype=float)
+        raise ValueError("Bracketing interval must be " \
+                         "length 2 or 3 sequence.")
 
-    fval = squeeze(func(x))
-    x1 = x.copy()
-    iter = 0;
-    ilist = range(N)
-    while True:
-        fx = fval
-        bigind = 0
-        delta = 0.0
-        for i in ilist:
-            direc1 = direc[i]
-            fx2 = fval
-            fval, x, direc1 = _linesearch_powell(func, x, direc1, tol=xtol*100)
-            if (fx2 - fval) > delta:
+def brent_batch(func, brack, args=(), tol=1.48e-8, full_output=0,
+                maxiter=500, indexed=False):
+    """Minimize many independent scalar problems using lockstep Brent.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Vectorized objective.  Given an array of points, one per problem,
+        it returns the corresponding costs.  If `indexed` is True it is
+        called as ``f(x,idx,*args)``, where ``idx[i]`` is the problem
+        number that ``x[i]`` belongs to.
+    brack : tuple
+        Bracket for each problem, as (a,c) or (a,b,c) with one array
+        for each end point.  Use ``(zeros(K),ones(K))`` for the default
+        starting interval of `brent`.
+    args : tuple
+        Additional arguments (if present), passed to `func`.
+    tol : float
+        Fractional precision of each minimum.
+    full_output : bool
+        If True, return all output args (xmin, fval, iter, funcalls).
+    maxiter : int
+        Maximum number of iterations for each problem.
+    indexed : bool
+        Set to True if func needs the problem number for each point.
+
+    Returns
+    -------
+    xmin : ndarray
+        Optimum point for each problem.
+    fval : ndarray
+        Optimum value for each problem.
+    iter : ndarray
+        Number of iterations for each problem.
+    funcalls : ndarray
+        Number of objective function evaluations made for each problem.
+
+    Notes
+    -----
+    Each problem follows the same golden and parabolic steps as `brent`
+    would take on its own.  Problems which have converged are no longer
+    evaluated, so `func` sees a shrinking set of points.
+
+    """
+    f = _lane_function(func, args, indexed)
+    xa,xb,xc,fa,fb,fc,_ = _bracket_batch_info(func, brack, args, indexed)
+    K = len(xb)
+    _mintol = 1.0e-11
+    _cg = 0.3819660
+
+    x = xb.copy(); w = x.copy(); v = x.copy()
+    fx = f(x, numpy.arange(K)); fw = fx.copy(); fv = fx.copy()
+    a = numpy.minimum(xa, xc)
+    b = numpy.maximum(xa, xc)
+    deltax = zeros(K)
+    rat = zeros(K)
+    funcalls = numpy.ones(K, int)
+    iter = zeros(K, int)
+    active = numpy.ones(K, bool)
+    olderr = numpy.seterr(all='ignore')
+    try:
+        while True:
+            tol1 = tol*abs(x) + _mintol
+            tol2 = 2.0*tol1
+            xmid = 0.5*(a+b)
+            active &= ~(abs(x-xmid) < (tol2-0.5*(b-a)))  # check convergence
+            active &= iter < maxiter
+            act = numpy.nonzero(active)[0]
+            if len(act) == 0:
+                break
+
+            # parabolic step where the last step was large enough
+            tmp1 = (x-w)*(fx-fv)
+            tmp2 = (x-v)*(fx-fw)
+            p = (x-v)*tmp2 - (x-w)*tmp1
+            tmp2 = 2.0*(tmp2-tmp1)
+            p = numpy.where(tmp2 > 0.0, -p, p)
+            tmp2 = abs(tmp2)
+            parabolic = ((abs(deltax) > tol1)
+                         & (p > tmp2*(a-x)) & (p < tmp2*(b-x))
+                         & (abs(p) < abs(0.5*tmp2*deltax)))
+            prat = p*1.0/tmp2
+            u = x + prat
+            edge = ((u-a) < tol2) | ((b-u) < tol2)
+            prat = numpy.where(edge, numpy.where(xmid-x >= 0, tol1, -tol1),
+                               prat)
+
+            # golden section step otherwise
+            gdelta = numpy.where(x >= xmid, a-x, b-x)
+            newrat = numpy.where(parabolic, prat, _cg*gdelta)
+            deltax = numpy.where(active,
+                                 numpy.where(parabolic, rat, gdelta), deltax)
+            rat = numpy.where(active, newrat, rat)
+
+            # update by at least tol1
+            u = numpy.where(abs(rat) < tol1,
+                            numpy.where(rat >= 0, x + tol1, x - tol1),
+                            x + rat)
+            fu = fx.copy()
+            fu[act] = f(u[act], act)
+            funcalls[act] += 1
+            iter[act] += 1
+
+            bigger = active & (fu > fx)
+            smaller = active & ~bigger
+            a = numpy.where(bigger & (u < x), u,
+                            numpy.where(smaller & (u >= x), x, a))
+            b = numpy.where(bigger & (u >= x), u,
+                            numpy.where(smaller & (u < x), x, b))
+            c1 = bigger & ((fu <= fw) | (w == x))
+            c2 = bigger & ~c1 & ((fu <= fv) | (v == x) | (v == w))
+            shift = c1 | smaller
+            v, fv = (numpy.where(shift, w, numpy.where(c2, u, v)),
+                     numpy.where(shift, fw, numpy.where(c2, fu, fv)))
+            w, fw = (numpy.where(c1, u, numpy.where(smaller, x, w)),
+                     numpy.where(c1, fu, numpy.where(smaller, fx, fw)))
+            x, fx = (numpy.where(smaller, u, x),
+                     numpy.where(smaller, fu, fx))
+    finally:
+        numpy.seterr(**olderr)
+
+    if full_output:
+        return x, fx, iter, funcalls
+    else:
+        return x
+
+def golden_batch(func, brack, args=(), tol=_epsilon, full_output=0,
+                 indexed=False):
+    """Minimize many independent scalar problems using lockstep golden
+    section search.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Vectorized objective, as for `brent_batch`.
+    brack : tuple
+        Bracket for each problem, as (a,c) or (a,b,c) with one array
+        for each end point.
+    args : tuple
+        Additional arguments (if present), passed to func.
+    tol : float
+        x tolerance stop criterion
+    full_output : bool
+        If True, return optional outputs (xmin, fval, funcalls).
+    indexed : bool
+        Set to True if func needs the problem number for each point.
+
+    Notes
+    -----
+    Each problem follows the same steps as `golden`.  Problems which have
+    converged are no longer evaluated.
+
+    """
+    f = _lane_function(func, args, indexed)
+    xa,xb,xc,fa,fb,fc,funcalls = _bracket_batch_info(func, brack, args,
+                                                     indexed)
+    K = len(xb)
+    allidx = numpy.arange(K)
+    _gR = 0.61803399
+    _gC = 1.0-_gR
+    x3 = xc
+    x0 = xa
+    right = abs(xc-xb) > abs(xb-xa)
+    x1 = numpy.where(right, xb, xb - _gC*(xb-xa))
+    x2 = numpy.where(right, xb + _gC*(xc-xb), xb)
+    f1 = f(x1, allidx)
+    f2 = f(x2, allidx)
+    funcalls = funcalls + 2
+    while True:
+        act = numpy.nonzero(abs(x3-x0) > tol*(abs(x1)+abs(x2)))[0]
+        if len(act) == 0:
+            break
+        up = numpy.zeros(K, bool)
+        up[act] = f2[act] < f1[act]
+        dn = numpy.zeros(K, bool)
+        dn[act] = ~up[act]
+        x0 = numpy.where(up, x1, x0)
+        x3 = numpy.where(dn, x2, x3)
+        x1, x2 = (numpy.where(up, x2, numpy.where(dn, _gR*x1 + _gC*x0, x1)),
+                  numpy.where(up, _gR*x2 + _gC*x3, numpy.where(dn, x1, x2)))
+        f1, f2 = numpy.where(up, f2, f1), numpy.where(dn, f1, f2)
+        xnew = numpy.where(up, x2, x1)
+        fnew = f(xnew[act], act)
+        f2[act] = numpy.where(up[act], fnew, f2[act])
+        f1[act] = numpy.where(dn[act], fnew, f1[act])
+        funcalls[act] += 1
+    lower = f1 < f2
+    xmin = numpy.where(lower, x1, x2)
+    fval = numpy.where(lower, f1, f2)
+    if full_output:
+        return xmin, fval, funcalls
+    else:
+        return xmin
+
+def fminbound_batch(func, x1, x2, args=(), xtol=1e-5, maxfun=500,
+                    full_output=0, disp=1, indexed=False):
+    """Bounded minimization for many independent scalar problems.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Vectorized objective, as for `brent_batch`.
+    x1, x2 : ndarray
+        The optimization bounds for each problem.  Scalars are broadcast.
+    args : tuple
+        Extra arguments passed to function.
+    xtol : float
+        The convergence tolerance.
+    maxfun : int
+        Maximum number of function evaluations allowed for each problem.
+    full_output : bool
+        If True, return optional outputs.
+    disp : int
+        If non-zero, print messages.
+    indexed : bool
+        Set to True if func needs the problem number for each point.
+
+    Returns
+    -------
+    xopt : ndarray
+        Parameters (over given interval) which minimize each objective.
+    fval : ndarray
+        The function value at each minimum point.
+    ierr : ndarray
+        An error flag for each problem (0 if converged, 1 if maximum
+        number of function calls reached).
+    numfunc : ndarray
+        The number of function calls made for each problem.
+
+    Notes
+    -----
+    Each problem follows the same steps as `fminbound` would take on its
+    own; problems which have converged are no longer evaluated.
+
+    """
+    a, b = _lanes(x1, x2)
+    if (a > b).any():
+        raise ValueError("The lower bound exceeds the upper bound.")
+    f = _lane_function(func, args, indexed)
+    K = len(a)
+
+    sqrt_eps = sqrt(2.2e-16)
+    golden_mean = 0.5*(3.0-sqrt(5.0))
+    fulc = a + golden_mean*(b-a)
+    nfc, xf = fulc.copy(), fulc.copy()
+    rat = zeros(K)
+    e = zeros(K)
+    fx = f(xf, numpy.arange(K))
+    num = numpy.ones(K, int)
+    ffulc = fx.copy()
+    fnfc = fx.copy()
+    xm = 0.5*(a+b)
+    tol1 = sqrt_eps*abs(xf) + xtol / 3.0
+    tol2 = 2.0*tol1
+
+    active = numpy.ones(K, bool)
+    olderr = numpy.seterr(all='ignore')
+    try:
+        while True:
+            active &= abs(xf-xm) > (tol2 - 0.5*(b-a))
+            active &= (num < maxfun) | (num == 1)
+            act = numpy.nonzero(active)[0]
+            if len(act) == 0:
+                break
+
+            # Check for parabolic fit
+            r = (xf-nfc)*(fx-ffulc)
+            q = (xf-fulc)*(fx-fnfc)
+            p = (xf-fulc)*q - (xf-nfc)*r
+            q = 2.0*(q-r)
+            p = numpy.where(q > 0.0, -p, p)
+            q = abs(q)
+            parabolic = ((abs(e) > tol1) & (abs(p) < abs(0.5*q*e))
+                         & (p > q*(a-xf)) & (p < q*(b-xf)))
+            prat = (p+0.0) / q
+            x = xf + prat
+            edge = ((x-a) < tol2) | ((b-x) < tol2)
+            si = numpy.sign(xm-xf) + ((xm-xf)==0)
+            prat = numpy.where(edge, tol1*si, prat)
+
+            # Otherwise do a golden-section step
+            ge = numpy.where(xf >= xm, a-xf, b-xf)
+            newrat = numpy.where(parabolic, prat, golden_mean*ge)
+            e = numpy.where(active, numpy.where(parabolic, rat, ge), e)
+            rat = numpy.where(active, newrat, rat)
+
+            si = numpy.sign(rat) + (rat == 0)
+            x = xf + si*numpy.maximum(abs(rat), tol1)
+            fu = fx.copy()
+            fu[act] = f(x[act], act)
+            num[act] += 1
+
+            better = active & (fu <= fx)
+            worse = active & ~better
+            a = numpy.where(better & (x >= xf), xf,
+                            numpy.where(worse & (x < xf), x, a))
+            b = numpy.where(better & (x < xf), xf,
+                            numpy.where(worse & (x >= xf), x, b))
+            c1 = worse & ((fu <= fnfc) | (nfc == xf))
+            c2 = worse & ~c1 & ((fu <= ffulc) | (fulc == xf) | (fulc == nfc))
+            shift = better | c1
+            fulc, ffulc = (numpy.where(shift, nfc, numpy.where(c2, x, fulc)),
+                           numpy.where(shift, fnfc,
+                                       numpy.where(c2, fu, ffulc)))
+            nfc, fnfc = (numpy.where(better, xf, numpy.where(c1, x, nfc)),
+                         numpy.where(better, fx, numpy.where(c1, fu, fnfc)))
+            xf, fx = (numpy.where(better, x, xf),
+                      numpy.where(better, fu, fx))
+
+            xm = 0.5*(a+b)
+            tol1 = sqrt_eps*abs(xf) + xtol/3.0
+            tol2 = 2.0*tol1
+    finally:
+        numpy.seterr(**olderr)
+
+    flag = numpy.where((num >= maxfun) & (num > 1), 1, 0)
+    if disp > 0:
+        print "Optimization terminated successfully for %d of %d problems." \
+              % (numpy.sum(flag == 0), K)
+        if (flag == 1).any():
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded for %d problems." % numpy.sum(flag == 1)
+
+    if full_output:
+        return xf, fx, flag, num
+    else:
+        return xf
+
+
+def _linesearch_powell(func, p, xi, tol=1e-3):
+    """Line-search algorithm using fminbound.
+
+    Find the minimium of the function ``func(x0+ alpha*direc)``.
+
+    """
+    def myfunc(alpha):
+        return func(p + alpha * xi)
+    alpha_min, fret, iter, num = brent(myfunc, full_output=1, tol=tol)
+    xi = alpha_min*xi
+    return squeeze(fret), p+xi, xi
+
+
+def _linesearch_parallel(block, p, xi, fp, tol=1e-3, npoints=8,
+                         maxiter=100):
+    """Line-search algorithm evaluating npoints trial points at a time.
+
+    Find the minimum of the function ``f(p + alpha*xi)``, where
+    ``block(X)`` returns f for each row of X and ``fp = f(p)``.  The first
+    round tries steps from 1e-3 to 1 in both directions, and the bracket
+    is extended downhill by doubling if needed.  Each later round
+    evaluates points spaced ``(c-a)/(2*npoints)`` apart around the vertex
+    of the parabola through the bracket (a,b,c), or evenly spaced across
+    the bracket if there is no vertex inside it, then shrinks the bracket
+    to the neighbours of the best point so far.  The alpha nearest 0
+    wins any tie, so the result depends only on npoints and a direction
+    along which f is flat leaves p where it is.
+
+    Returns the same values as `_linesearch_powell`.
+    """
+    _mintol = 1.0e-11
+    npoints = pymax(npoints, 2)
+    A = numpy.array([0.0])
+    F = numpy.array([fp], dtype=float)
+    def evaluate(A, F, alpha):
+        alpha = numpy.setdiff1d(alpha, A)
+        if len(alpha):
+            fa = asarray(block(p + alpha[:,None]*xi), dtype=float)
+            A, F = numpy.hstack((A, alpha)), numpy.hstack((F, fa))
+            order = numpy.argsort(A, kind='mergesort')
+            A, F = A[order], F[order]
+        ties = numpy.flatnonzero(F == F.min())
+        return A, F, ties[argmin(abs(A[ties]))]
+
+    # Bracket the minimum, extending from an end point while it is
+    # strictly downhill from its neighbour.
+    h = npoints//2
+    steps = 10.0**numpy.linspace(-3, 0, h)
+    A, F, i = evaluate(A, F, numpy.hstack((-steps, steps)))
+    iter = 0
+    while (i == 0 and F[0] < F[1]) or (i == len(A)-1 and F[-1] < F[-2]):
+        if iter > maxiter:
+            raise RuntimeError("Too many iterations.")
+        iter += 1
+        A, F, i = evaluate(A, F, A[i]*2.0**numpy.arange(1, npoints+1))
+
+    # Shrink the bracket around the best point.
+    while 0 < i < len(A)-1:
+        a, b, c = A[i-1], A[i], A[i+1]
+        if c - a <= 4.0*(tol*abs(b) + _mintol) or iter > maxiter:
+            break
+        iter += 1
+        fa, fb, fc = F[i-1], F[i], F[i+1]
+        trial = []
+        denom = (b-a)*(fb-fc) - (b-c)*(fb-fa)
+        if denom != 0.0:
+            u = b - 0.5*((b-a)**2*(fb-fc) - (b-c)**2*(fb-fa))/denom
+            if a < u < c:
+                k = (npoints-1)//2
+                trial = u + (c-a)/(2.0*npoints)*numpy.arange(-k, npoints-k)
+                trial = trial[(trial > a) & (trial < c)]
+        if len(trial) == 0:
+            trial = numpy.linspace(a, c, npoints+2)[1:-1]
+        n = len(A)
+        A, F, i = evaluate(A, F, trial)
+        if len(A) == n:
+            break
+
+    alpha = A[i]
+    return squeeze(F[i]), p + alpha*xi, alpha*xi
+
+
+class Powell:
+    """
+    Powell direction set minimizer which keeps its state between steps.
+
+    Each `step` is one sweep of line searches over the direction set,
+    preceded by the extrapolation and direction update from the previous
+    sweep.  `run`, `state` and `from_state` behave as for `NelderMead`.
+    With *mapper* or *vectorized*, the line searches evaluate *npoints*
+    trial points at a time (see `fmin_powell`).
+    """
+    def __init__(self, func, x0, args=(), xtol=1e-4, ftol=1e-4, direc=None,
+                 cache=None, mapper=None, vectorized=False, npoints=8):
+        self.xtol = xtol
+        self.ftol = ftol
+        self.npoints = npoints
+        cache = _make_cache(cache)
+        self.parallel = vectorized or mapper is not None
+        if self.parallel:
+            self.fcalls = [0]
+            self.block = wrap_points(func, args, self.fcalls, cache=cache,
+                                     vectorized=vectorized, mapper=mapper)
+            self.func = self._point
+        else:
+            self.fcalls, self.func = wrap_function(func, args, cache)
+        self.iter = 0
+        if x0 is not None:
+            self.x = asarray(x0).flatten()
+            N = len(self.x)
+            if direc is None:
+                self.direc = eye(N, dtype=float)
+            else:
+                self.direc = asarray(direc, dtype=float)
+            self.fval = squeeze(self.func(self.x))
+            self.x1 = self.x.copy()
+            self._fx, self._delta, self._bigind = self.fval, 0.0, 0
+
+    def step(self):
+        """Update the direction set then perform one sweep of line searches."""
+        func = self.func
+        x, fval, x1, direc = self.x, self.fval, self.x1, self.direc
+        tol = self.xtol*100
+        self.last_step = 'sweep'
+        if self.iter > 0:
+            fx, delta, bigind = self._fx, self._delta, self._bigind
+            # Construct the extrapolated point
+            direc1 = x - x1
+            x2 = 2*x - x1
+            x1 = x.copy()
+            fx2 = squeeze(func(x2))
+
+            if (fx > fx2):
+                t = 2.0*(fx+fx2-2.0*fval)
+                temp = (fx-fval-delta)
+                t *= temp*temp
+                temp = fx-fx2
+                t -= delta*temp*temp
+                if t < 0.0:
+                    fval, x, direc1 = self._linesearch(x, direc1, fval, tol)
+                    direc[bigind] = direc[-1]
+                    direc[-1] = direc1
+                    self.last_step = 'extrap'
+
+        fx = fval
+        bigind = 0
+        delta = 0.0
+        for i in range(len(direc)):
+            direc1 = direc[i]
+            fx2 = fval
+            fval, x, direc1 = self._linesearch(x, direc1, fval, tol)
+            if (fx2 - fval) > delta:
                 delta = fx2 - fval
                 bigind = i
-        iter += 1
-        if callback is not None:
-            callback(x)
-        if retall:
-            allvecs.append(x)
-        if (2.0*(fx - fval) <= ftol*(abs(fx)+abs(fval))+1e-20): break
-        if fcalls[0] >= maxfun: break
-        if iter >= maxiter: break
-
-        # Construct the extrapolated point
-        direc1 = x - x1
-        x2 = 2*x - x1
-        x1 = x.copy()
-        fx2 = squeeze(func(x2))
-
-        if (fx > fx2):
-            t = 2.0*(fx+fx2-2.0*fval)
-            temp = (fx-fval-delta)
-            t *= temp*temp
-            temp = fx-fx2
-            t -= delta*temp*temp
-            if t < 0.0:
-                fval, x, direc1 = _linesearch_powell(func, x, direc1,
-                                                     tol=xtol*100)
-                direc[bigind] = direc[-1]
-                direc[-1] = direc1
+        self.iter += 1
+        self.x, self.fval, self.x1 = x, fval, x1
+        self._fx, self._delta, self._bigind = fx, delta, bigind
 
-    warnflag = 0
-    if fcalls[0] >= maxfun:
-        warnflag = 1
+    def _point(self, x):
+        return self.block(asarray(x)[None,:])[0]
+
+    def _linesearch(self, x, xi, fval, tol):
+        if self.parallel:
+            return _linesearch_parallel(self.block, x, xi, fval, tol=tol,
+                                        npoints=self.npoints)
+        else:
+            return _linesearch_powell(self.func, x, xi, tol=tol)
+
+    def converged(self):
+        fx, fval = self._fx, self.fval
+        return (self.iter > 0 and
+                2.0*(fx - fval) <= self.ftol*(abs(fx)+abs(fval))+1e-20)
+
+    def run(self, maxiter=None, maxfun=None):
+        """
+        Iterate until converged or until the total number of iterations
+        or function calls reaches *maxiter* or *maxfun* (default N*1000).
+
+        Returns the warnflag as in `fmin_powell`.
+        """
+        N = len(self.x)
+        if maxiter is None:
+            maxiter = N * 1000
+        if maxfun is None:
+            maxfun = N * 1000 * (self.npoints if self.parallel else 1)
+        while not (self.converged() or self.fcalls[0] >= maxfun
+                   or self.iter >= maxiter):
+            self.step()
+        return self.warnflag(maxiter, maxfun)
+
+    def warnflag(self, maxiter, maxfun):
+        if self.fcalls[0] >= maxfun:
+            return 1
+        elif self.iter >= maxiter:
+            return 2
+        else:
+            return 0
+
+    def state(self):
+        return dict(method='Powell',
+                    x=self.x.copy(), fval=self.fval, x1=self.x1.copy(),
+                    direc=self.direc.copy(), iter=self.iter,
+                    funcalls=self.fcalls[0], xtol=self.xtol, ftol=self.ftol,
+                    fx=self._fx, delta=self._delta, bigind=self._bigind)
+
+    @classmethod
+    def from_state(cls, func, state, args=(), cache=None, mapper=None,
+                   vectorized=False, npoints=8):
+        """Rebuild an optimizer for func from the result of `state`."""
+        if str(state['method']) != 'Powell':
+            raise ValueError("state is for %s, not Powell" % state['method'])
+        opt = cls(func, None, args=args, xtol=float(state['xtol']),
+                  ftol=float(state['ftol']), cache=cache, mapper=mapper,
+                  vectorized=vectorized, npoints=npoints)
+        opt.x = asarray(state['x']).copy()
+        opt.x1 = asarray(state['x1']).copy()
+        opt.direc = asarray(state['direc'], dtype=float).copy()
+        opt.fval = squeeze(state['fval'])
+        opt.iter = int(state['iter'])
+        opt.fcalls[0] = int(state['funcalls'])
+        opt._fx = squeeze(state['fx'])
+        opt._delta = float(state['delta'])
+        opt._bigind = int(state['bigind'])
+        return opt
+
+    def get_result(self, full_output=False):
+        if full_output:
+            return (squeeze(self.x), self.fval, self.direc, self.iter,
+                    self.fcalls[0])
+        else:
+            return squeeze(self.x)
+
+
+def fmin_powell(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
+                maxfun=None, full_output=0, disp=1, retall=0, callback=None,
+                direc=None, cache=None, trace=None, mapper=None,
+                vectorized=False, npoints=8, bounds=None, budget=None):
+    """
+    Minimize a function using modified Powell's method.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Objective function to be minimized.
+    x0 : ndarray
+        Initial guess.
+    args : tuple
+        Extra arguments passed to func.
+    callback : callable
+        An optional user-supplied function, called after each
+        iteration.  Called as ``callback(xk)``, where ``xk`` is the
+        current parameter vector.
+    direc : ndarray
+        Initial direction set.
+
+    Returns
+    -------
+    xopt : ndarray
+        Parameter which minimizes `func`.
+    fopt : number
+        Value of function at minimum: ``fopt = func(xopt)``.
+    direc : ndarray
+        Current direction set.
+    iter : int
+        Number of iterations.
+    funcalls : int
+        Number of function calls made.
+    warnflag : int
+        Integer warning flag:
+            1 : Maximum number of function evaluations.
+            2 : Maximum number of iterations.
+            3 : Budget exhausted; xopt is the best point evaluated.
+    allvecs : list
+        List of solutions at each iteration.
+    cachestats : tuple
+        Cache (hits, misses), if a cache is used.
+
+    Other Parameters
+    ----------------
+    xtol : float
+        Line-search error tolerance.
+    ftol : float
+        Relative error in ``func(xopt)`` acceptable for convergence.
+    maxiter : int
+        Maximum number of iterations to perform.
+    maxfun : int
+        Maximum number of function evaluations to make.  The default is
+        N*1000, or N*1000*npoints for parallel line searches.
+    full_output : bool
+        If True, fopt, xi, direc, iter, funcalls, and
+        warnflag are returned.
+    disp : bool
+        If True, print convergence messages.
+    retall : bool
+        If True, return a list of the solution at each iteration.
+    cache : int or FunctionCache
+        Size of the cache of previously evaluated points, or an existing
+        `FunctionCache` to share with other fits of the same function.
+    trace : Trace
+        Record the progress of each iteration in trace.  The size is the
+        distance moved in the iteration.
+    mapper : callable map(f, points)
+        Map function, such as ``multiprocessing.Pool().map``, used to
+        evaluate the trial points of each line search in parallel.
+    vectorized : bool
+        If True, func is called with an (M,N) array of points and
+        returns M values.
+    npoints : int
+        Number of trial points evaluated together in each round of a
+        parallel line search.  Use a multiple of the number of workers.
+    bounds : sequence
+        (lower, upper) pair for each parameter, using None for no limit.
+        The search moves in transformed parameters which always map into
+        the box, as for `fmin`, so direc is in transformed parameters.
+    budget : Budget
+        Limit on wall time and function calls, possibly shared with other
+        minimizers.  It covers the calls made by the line searches, and
+        a parallel line search is charged for its whole block of points.
+
+    Notes
+    -----
+    Uses a modification of Powell's method to find the minimum of
+    a function of N variables.
+
+    If *mapper* or *vectorized* is given, each line search evaluates
+    *npoints* trial points at a time instead of one Brent step at a
+    time.  A line search then takes a handful of rounds rather than a
+    dozen or more sequential calls, at the cost of more calls in total.
+    The trial points depend only on *npoints*, so the result is the same
+    for any pool size or order of completion.
+
+    """
+    cache = _make_cache(cache)
+    parallel = vectorized or mapper is not None
+    if trace is not None and not parallel:
+        func = trace.timed(func)
+    x = asarray(x0).flatten()
+    N = len(x)
+    if bounds is not None:
+        box = _BoxTransform(bounds, N)
+        x = box.clip(x)
+        func, start, external = (_BoundedFunction(func, box),
+                                 box.to_internal(x), box.to_external)
+    else:
+        start, external = x, lambda x: x
+    if retall:
+        allvecs = [x]
+    if maxiter is None:
+        maxiter = N * 1000
+    if maxfun is None:
+        maxfun = N * 1000 * (npoints if parallel else 1)
+
+    opts = dict(cache=cache, mapper=mapper, vectorized=vectorized)
+    if budget is not None:
+        if parallel:
+            # Charge whole blocks in this process, so func stays picklable.
+            block = wrap_points(func, args, [0], cache=cache,
+                                vectorized=vectorized, mapper=mapper)
+            if trace is not None:
+                block = trace.timed(block)
+            func = _BudgetFunction(block, budget, block=True)
+            args, opts = (), dict(vectorized=True)
+        else:
+            func = _BudgetFunction(func, budget)
+    opt = None
+    try:
+        opt = Powell(func, start, args=args, xtol=xtol, ftol=ftol,
+                     direc=direc, npoints=npoints, **opts)
+        if trace is not None and parallel and budget is None:
+            # Time the blocks in this process so that func stays picklable.
+            opt.block = trace.timed(opt.block)
+        fcalls = opt.fcalls
+        while True:
+            xprev = opt.x
+            opt.step()
+            if trace is not None:
+                trace.record(opt.iter, fcalls[0], opt.fval,
+                             vecnorm(opt.x - xprev), opt.last_step)
+            if callback is not None:
+                callback(external(opt.x))
+            if retall:
+                allvecs.append(external(opt.x))
+            if opt.converged(): break
+            if fcalls[0] >= maxfun: break
+            if opt.iter >= maxiter: break
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        # Keep the best point evaluated, which may be inside a line search.
+        if opt is None:
+            x, fval = func.best()
+            fcalls, iter, direc = [func.ncalls], 0, direc
+        else:
+            x, fval = func.best(opt.x, opt.fval)
+            fcalls, iter, direc = opt.fcalls, opt.iter, opt.direc
+        x = external(start if x is None else x)
+        warnflag = 3
+    else:
+        x, fval, direc, iter = external(opt.x), opt.fval, opt.direc, opt.iter
+        warnflag = opt.warnflag(maxiter, maxfun)
+
+    if warnflag == 1:
         if disp:
             print "Warning: Maximum number of function evaluations has "\
                   "been exceeded."
-    elif iter >= maxiter:
-        warnflag = 2
+    elif warnflag == 2:
         if disp:
             print "Warning: Maximum number of iterations has been exceeded"
+    elif warnflag == 3:
+        if disp:
+            print "Warning: Budget exhausted; returning the best point so far."
     else:
         if disp:
             print "Optimization terminated successfully."
@@ -1061,6 +2985,8 @@ def fmin_powell(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
         retlist = x, fval, direc, iter, fcalls[0], warnflag
         if retall:
             retlist += (allvecs,)
+        if cache is not None:
+            retlist += (cache.stats(),)
     else:
         retlist = x
         if retall:
@@ -1071,6 +2997,305 @@ def fmin_powell(func, x0, args=(), xtol=1e-4, ftol=1e-4, maxiter=None,
 
 
 
+def fmin_lm(func, x0, args=(), Dfun=None, xtol=1e-8, ftol=1e-8, gtol=1e-10,
+            maxiter=None, maxfun=None, full_output=0, disp=1, trace=None):
+    """
+    Minimize a sum of squares using the Levenberg-Marquardt algorithm.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Residual function, returning a vector whose sum of squares is
+        to be minimized.
+    x0 : ndarray
+        Initial guess.
+    args : tuple
+        Extra arguments passed to func and Dfun.
+    Dfun : callable Dfun(x,*args)
+        Jacobian of func, returning an (M,N) array with the derivatives
+        of the M residuals with respect to the N parameters.  If not
+        given, the Jacobian is estimated by forward differences.
+
+    Returns
+    -------
+    xopt : ndarray
+        Parameters which minimize the sum of squares.
+    fopt : float
+        Sum of squared residuals at xopt.
+    cov : ndarray
+        Covariance matrix ``inv(J'J)`` at xopt.  This is the parameter
+        covariance if the residuals are normalized by their uncertainty.
+    iter : int
+        Number of iterations.
+    funcalls : int
+        Number of function calls made, including those used to
+        estimate the Jacobian.
+    warnflag : int
+        1 : Maximum number of function evaluations.
+        2 : Maximum number of iterations.
+
+    Other Parameters
+    ----------------
+    xtol : float
+        Relative step size acceptable for convergence.
+    ftol : float
+        Relative reduction in sum of squares acceptable for convergence.
+    gtol : float
+        Gradient size acceptable for convergence.
+    maxiter : int
+        Maximum number of iterations to perform.
+    maxfun : int
+        Maximum number of function evaluations to make.
+    full_output : bool
+        If True, fopt, cov, iter, funcalls and warnflag are returned.
+    disp : bool
+        If True, print convergence messages.
+    trace : Trace
+        Record the progress of each iteration in trace.  The step is
+        accept or reject and the size is the length of the step.
+
+    Notes
+    -----
+    Uses Marquardt scaling of the damping term by the diagonal of J'J,
+    with the damping updated from the ratio of actual to predicted
+    reduction as described by Nielsen (1999).
+
+    """
+    if trace is not None:
+        func = trace.timed(func)
+    fcalls, func = wrap_function(func, args)
+    x = asfarray(x0).flatten()
+    N = len(x)
+    if maxiter is None:
+        maxiter = N * 100
+    if maxfun is None:
+        maxfun = (N+1) * 200
+
+    if Dfun is None:
+        def jac(x):
+            step = _epsilon*numpy.maximum(abs(x), 1.0)
+            return approx_jacobian(func, x, epsilon=step)
+    else:
+        def jac(x):
+            return asfarray(Dfun(x,*args))
+
+    r = asfarray(func(x)).ravel()
+    fval = numpy.dot(r,r)
+    J = jac(x)
+    A, g = numpy.dot(J.T,J), numpy.dot(J.T,r)
+    mu = 1e-3*max(numpy.diag(A))
+    nu = 2.0
+    iter = 0
+    warnflag = 0
+    while True:
+        if max(abs(g)) <= gtol:
+            break
+        if fcalls[0] >= maxfun:
+            warnflag = 1
+            break
+        if iter >= maxiter:
+            warnflag = 2
+            break
+        iter += 1
+
+        D = numpy.maximum(numpy.diag(A), 1e-12*max(numpy.diag(A)))
+        try:
+            dx = numpy.linalg.solve(A + mu*numpy.diag(D), -g)
+        except numpy.linalg.LinAlgError:
+            mu *= nu; nu *= 2
+            continue
+        if vecnorm(dx) <= xtol*(vecnorm(x)+xtol):
+            break
+
+        xnew = x + dx
+        rnew = asfarray(func(xnew)).ravel()
+        fnew = numpy.dot(rnew,rnew)
+        predicted = numpy.dot(dx, mu*D*dx - g)
+        rho = (fval - fnew)/predicted if predicted > 0 else -1.0
+        if rho > 0:
+            converged = (fval - fnew) <= ftol*fval
+            x, r, fval = xnew, rnew, fnew
+            J = jac(x)
+            A, g = numpy.dot(J.T,J), numpy.dot(J.T,r)
+            mu *= pymax(1/3., 1 - (2*rho-1)**3)
+            nu = 2.0
+        else:
+            converged = False
+            mu *= nu; nu *= 2
+        if trace is not None:
+            trace.record(iter, fcalls[0], fval, vecnorm(dx),
+                         'accept' if rho > 0 else 'reject')
+        if converged:
+            break
+
+    cov = numpy.linalg.pinv(A)
+
+    if warnflag == 1:
+        if disp:
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded."
+    elif warnflag == 2:
+        if disp:
+            print "Warning: Maximum number of iterations has been exceeded"
+    else:
+        if disp:
+            print "Optimization terminated successfully."
+            print "         Current function value: %f" % fval
+            print "         Iterations: %d" % iter
+            print "         Function evaluations: %d" % fcalls[0]
+
+    if full_output:
+        return x, fval, cov, iter, fcalls[0], warnflag
+    else:
+        return x
+
+
+def fmin_poisson(func, x0, y, args=(), Dfun=None, xtol=1e-8, ftol=1e-10,
+                 gtol=1e-10, maxiter=None, maxfun=None, full_output=0, disp=1,
+                 trace=None):
+    """
+    Maximum likelihood fit of Poisson counts using Fisher scoring.
+
+    Parameters
+    ----------
+    func : callable f(x,*args)
+        Model function, returning the expected counts for parameters x.
+        Return NaN to mark x as infeasible.
+    x0 : ndarray
+        Initial guess.
+    y : ndarray
+        Observed counts.
+    args : tuple
+        Extra arguments passed to func and Dfun.
+    Dfun : callable Dfun(x,*args)
+        Jacobian of func, returning an (M,N) array with the derivatives
+        of the M expected counts with respect to the N parameters.  If
+        not given, the Jacobian is estimated by forward differences.
+
+    Returns
+    -------
+    xopt : ndarray
+        Maximum likelihood parameters.
+    fopt : float
+        Negative log likelihood at xopt, ``sum(f - y*log(f))``, leaving
+        out the constant ``sum(log(y!))``.
+    cov : ndarray
+        Inverse of the Fisher information ``J' diag(1/f) J`` at xopt.
+    iter : int
+        Number of iterations.
+    funcalls : int
+        Number of function calls made, including those used to
+        estimate the Jacobian.
+    warnflag : int
+        1 : Maximum number of function evaluations.
+        2 : Maximum number of iterations.
+
+    Other Parameters
+    ----------------
+    xtol, ftol, gtol, maxiter, maxfun, full_output, disp, trace
+        As for `fmin_lm`.
+
+    Notes
+    -----
+    Each iteration solves a weighted least squares problem with weights
+    1/f, which is equivalent to iteratively reweighted least squares.
+    If the full scoring step fails to reduce the negative log likelihood
+    or leaves the feasible region, a Levenberg damping term is added and
+    increased until the step succeeds.
+
+    """
+    if trace is not None:
+        func = trace.timed(func)
+    fcalls, func = wrap_function(func, args)
+    x = asfarray(x0).flatten()
+    y = asfarray(y).ravel()
+    N = len(x)
+    if maxiter is None:
+        maxiter = N * 100
+    if maxfun is None:
+        maxfun = (N+1) * 200
+
+    if Dfun is None:
+        def jac(x):
+            step = _epsilon*numpy.maximum(abs(x), 1.0)
+            return approx_jacobian(func, x, epsilon=step)
+    else:
+        def jac(x):
+            return asfarray(Dfun(x,*args))
+    def nllf(x):
+        mu = asfarray(func(x)).ravel()
+        if numpy.isnan(mu).any() or not (mu > 0).all():
+            return mu, numpy.inf
+        return mu, numpy.sum(mu - y*numpy.log(mu))
+
+    mu, fval = nllf(x)
+    if isinf(fval):
+        raise ValueError("Expected counts must be positive at x0.")
+    J = jac(x)
+    lam = 0.0
+    iter = 0
+    warnflag = 0
+    while True:
+        I = numpy.dot(J.T, J/mu[:,None])
+        g = numpy.dot(J.T, 1 - y/mu)
+        if max(abs(g)) <= gtol:
+            break
+        if fcalls[0] >= maxfun:
+            warnflag = 1
+            break
+        if iter >= maxiter:
+            warnflag = 2
+            break
+        iter += 1
+
+        D = numpy.maximum(numpy.diag(I), 1e-12*max(numpy.diag(I)))
+        try:
+            dx = numpy.linalg.solve(I + lam*numpy.diag(D), -g)
+        except numpy.linalg.LinAlgError:
+            lam = pymax(10*lam, 1e-3)
+            continue
+        if vecnorm(dx) <= xtol*(vecnorm(x)+xtol):
+            break
+
+        xnew = x + dx
+        munew, fnew = nllf(xnew)
+        accept = fnew < fval
+        if accept:
+            converged = (fval - fnew) <= ftol*abs(fval)
+            x, mu, fval = xnew, munew, fnew
+            J = jac(x)
+            lam = lam/10 if lam > 1e-7 else 0.0
+        else:
+            converged = False
+            lam = pymax(10*lam, 1e-3)
+        if trace is not None:
+            trace.record(iter, fcalls[0], fval, vecnorm(dx),
+                         'accept' if accept else 'reject')
+        if converged:
+            break
+
+    cov = numpy.linalg.pinv(numpy.dot(J.T, J/mu[:,None]))
+
+    if warnflag == 1:
+        if disp:
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded."
+    elif warnflag == 2:
+        if disp:
+            print "Warning: Maximum number of iterations has been exceeded"
+    else:
+        if disp:
+            print "Optimization terminated successfully."
+            print "         Current function value: %f" % fval
+            print "         Iterations: %d" % iter
+            print "         Function evaluations: %d" % fcalls[0]
+
+    if full_output:
+        return x, fval, cov, iter, fcalls[0], warnflag
+    else:
+        return x
+
+
 def _endprint(x, flag, fval, maxfun, xtol, disp):
     if flag == 0:
         if disp > 1:
@@ -1080,16 +3305,98 @@ def _endprint(x, flag, fval, maxfun, xtol, disp):
     if flag == 1:
         print "\nMaximum number of function evaluations exceeded --- " \
               "increase maxfun argument.\n"
+    if flag == 3:
+        print "\nBudget exhausted; returning the best point so far.\n"
     return
 
 
-def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin):
+def _brute_blocks(func, axes, args, chunksize, topk, trace=None):
+    """
+    Evaluate func over the grid with the given *axes* in blocks of at most
+    *chunksize* points, keeping the best *topk* points seen so far.
+    Each block is recorded in *trace*, if given.
+
+    Returns the flat indices and values of the best points, sorted.
+    """
+    Nshape = tuple(len(v) for v in axes)
+    total = int(numpy.prod(Nshape))
+    keep = pymax(topk, 1)
+    besti = numpy.empty(0, int)
+    bestf = numpy.empty(0, float)
+    for start in range(0, total, chunksize):
+        indx = numpy.arange(start, pymin(start+chunksize, total))
+        Nindx = numpy.unravel_index(indx, Nshape)
+        P = numpy.column_stack([v[i] for v,i in zip(axes, Nindx)])
+        F = asarray(func(P,*args), dtype=float).reshape(len(indx))
+        besti = numpy.concatenate((besti, indx))
+        bestf = numpy.concatenate((bestf, F))
+        if len(bestf) > keep:
+            sel = numpy.argpartition(bestf, keep-1)[:keep]
+            besti, bestf = besti[sel], bestf[sel]
+        if trace is not None:
+            trace.record(start//chunksize, indx[-1]+1, numpy.min(bestf),
+                         _grid_spacing(axes), 'grid')
+    order = numpy.argsort(bestf, kind='mergesort')
+    return besti[order], bestf[order]
+
+def _grid_spacing(axes):
+    """Return the largest step between grid points on any axis."""
+    return pymax([abs(v[1]-v[0]) if len(v) > 1 else 0. for v in axes])
+
+def _grid_points(axes, indx):
+    """Return the (M,N) grid points at the flat indices *indx*."""
+    Nindx = numpy.unravel_index(indx, tuple(len(v) for v in axes))
+    return numpy.column_stack([v[i] for v,i in zip(axes, Nindx)])
+
+def _brute_adaptive(func, axes, args, chunksize, keep, resolution, maxfun,
+                    trace=None):
+    """
+    Evaluate func on the coarse grid with the given *axes*, then repeatedly
+    split the cells around the best *keep* points into 3**N subcells until
+    the cell width is below *resolution* times the range on every axis or
+    the next level would take more than *maxfun* evaluations in total.
+
+    Returns the best points and their values, sorted.
+    """
+    N = len(axes)
+    indx, F = _brute_blocks(func, axes, args, chunksize, keep, trace)
+    X = _grid_points(axes, indx)
+    nfev = int(numpy.prod([len(v) for v in axes]))
+    h = asfarray([v[1]-v[0] if len(v) > 1 else 0. for v in axes])
+    span = asfarray([v[-1]-v[0] for v in axes])
+    # Offsets of the subcell centres, excluding the centre which is known.
+    steps = tuple(slice(-1,2) if hk != 0 else slice(0,1) for hk in h)
+    offsets = mgrid[steps].reshape(N,-1).T
+    offsets = offsets[abs(offsets).sum(axis=1) > 0]
+    while (abs(h) > resolution*abs(span)).any():
+        if maxfun is not None and nfev + len(X)*len(offsets) > maxfun:
+            break
+        h = h/3.
+        P = (X[:,None,:] + offsets[None,:,:]*h).reshape(-1,N)
+        FP = numpy.concatenate([
+                asarray(func(P[k:k+chunksize],*args), dtype=float).ravel()
+                for k in range(0, len(P), chunksize)])
+        nfev += len(P)
+        X = numpy.concatenate((X, P))
+        F = numpy.concatenate((F, FP))
+        order = numpy.argsort(F, kind='mergesort')[:keep]
+        X, F = X[order], F[order]
+        if trace is not None:
+            trace.record(trace.records[-1][0]+1, nfev, F[0], max(abs(h)),
+                         'refine')
+    return X, F
+
+def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin,
+          cache=None, vectorized=False, chunksize=65536, topk=0,
+          adaptive=False, keep=3, resolution=1e-3, maxfun=None,
+          trace=None, budget=None):
     """Minimize a function over a given range by brute force.
 
     Parameters
     ----------
     func : callable ``f(x,*args)``
-        Objective function to be minimized.
+        Objective function to be minimized.  If *vectorized*, then *x*
+        is an (M,N) block of grid points and *f* returns M values.
     ranges : tuple
         Each element is a tuple of parameters or a slice object to
         be handed to ``numpy.mgrid``.
@@ -1099,6 +3406,41 @@ def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin):
         Default number of samples, if those are not provided.
     full_output : bool
         If True, return the evaluation grid.
+    cache : int or FunctionCache
+        Cache passed on to `finish` (which must then accept a *cache*
+        keyword, as `fmin` and `fmin_powell` do), seeded with the grid
+        minimum so that the starting point is not evaluated again.
+    vectorized : bool
+        If True, generate the grid lazily and evaluate it in blocks
+        rather than building the full grid in memory.
+    chunksize : int
+        Number of grid points in each block when *vectorized*.
+    topk : int
+        Number of best grid points to return when *vectorized*.
+    adaptive : bool
+        If True, refine the grid around the best points rather than
+        stopping at the initial grid.
+    keep : int
+        Number of cells refined at each level when *adaptive*.
+    resolution : float
+        Stop refining once the cell width is below this fraction of
+        the range on every axis.
+    maxfun : int
+        Maximum number of function evaluations for the *adaptive* grid
+        search, not counting those made by `finish`.
+    trace : Trace
+        Record the progress of the grid search in trace, with one record
+        for each block, or for the whole grid if not *vectorized*, and
+        one for each level of *adaptive* refinement.  The trace is also
+        passed on to `finish`, which must then accept a *trace* keyword.
+    budget : Budget
+        Limit on wall time and function calls for the grid search and
+        `finish` together, charging each block of a *vectorized* search
+        as a whole.  The budget is passed on to `finish`, which must then
+        accept a *budget* keyword.  If it runs out during the
+        grid search, the best point so far is returned without calling
+        `finish`, with *grid* and *Jout* set to None, and budget.exceeded
+        is set.
 
     Returns
     -------
@@ -1108,15 +3450,31 @@ def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin):
         Function value at minimum.
     grid : tuple
         Representation of the evaluation grid.  It has the same
-        length as x0.
+        length as x0.  If *vectorized*, this is instead the (topk,N)
+        array of best grid points, in order, or if *adaptive*, the
+        best *keep* points from the finest level.
     Jout : ndarray
-        Function values over grid:  ``Jout = func(*grid)``.
+        Function values over grid:  ``Jout = func(*grid)``.  If
+        *vectorized* or *adaptive*, the function values at the best
+        points.
 
     Notes
     -----
     Find the minimum of a function evaluated on a grid given by
     the tuple ranges.
 
+    In *vectorized* mode only the running minimum and the *topk* best
+    points are kept, so memory use depends on *chunksize* rather than
+    on the size of the grid.  The finishing minimizer receives a
+    function of a single point which calls *func* with a 1 x N block.
+
+    In *adaptive* mode the ranges define a coarse grid, and the cell
+    around each of the best *keep* points is split into 3**N subcells
+    whose centres are evaluated next.  Each level reduces the cell width
+    by a factor of 3, at a cost of keep*(3**N-1) evaluations, so a small
+    *Ns* is sufficient.  The search can miss a minimum narrower than the
+    coarse grid spacing.
+
     """
     N = len(ranges)
     if N > 40:
@@ -1128,38 +3486,93 @@ def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin):
             if len(lrange[k]) < 3:
                 lrange[k] = tuple(lrange[k]) + (complex(Ns),)
             lrange[k] = slice(*lrange[k])
-    if (N==1):
-        lrange = lrange[0]
-
-    def _scalarfunc(*params):
-        params = squeeze(asarray(params))
-        return func(params,*args)
-
-    vecfunc = vectorize(_scalarfunc)
-    grid = mgrid[lrange]
-    if (N==1):
-        grid = (grid,)
-    Jout = vecfunc(*grid)
-    Nshape = shape(Jout)
-    indx = argmin(Jout.ravel(),axis=-1)
-    Nindx = zeros(N,int)
-    xmin = zeros(N,float)
-    for k in range(N-1,-1,-1):
-        thisN = Nshape[k]
-        Nindx[k] = indx % Nshape[k]
-        indx = indx // thisN
-    for k in range(N):
-        xmin[k] = grid[k][tuple(Nindx)]
-
-    Jmin = Jout[tuple(Nindx)]
-    if (N==1):
-        grid = grid[0]
-        xmin = xmin[0]
+    if trace is not None:
+        func = trace.timed(func)
+    axes = [asfarray(mgrid[s]) for s in lrange]
+    # The grid is charged to the budget here; finish charges its own calls.
+    gridfunc = func
+    if budget is not None:
+        gridfunc = _BudgetFunction(func, budget, block=vectorized)
+
+    try:
+        if vectorized or adaptive:
+            if vectorized:
+                blockfunc = gridfunc
+            else:
+                def blockfunc(P, *args):
+                    return [gridfunc(squeeze(p),*args) for p in P]
+            if adaptive:
+                grid, Jout = _brute_adaptive(blockfunc, axes, args, chunksize,
+                                             keep, resolution, maxfun, trace)
+            else:
+                indx, Jout = _brute_blocks(blockfunc, axes, args, chunksize,
+                                           topk, trace)
+                grid = _grid_points(axes, indx)
+            xmin, Jmin = grid[0].copy(), Jout[0]
+            if vectorized:
+                blockfunc = func
+                def func(x, *args):
+                    return blockfunc(numpy.reshape(x, (1,N)), *args)[0]
+            if (N==1):
+                xmin = xmin[0]
+        else:
+            if (N==1):
+                lrange = lrange[0]
+
+            def _scalarfunc(*params):
+                params = squeeze(asarray(params))
+                return gridfunc(params,*args)
+
+            vecfunc = vectorize(_scalarfunc)
+            grid = mgrid[lrange]
+            if (N==1):
+                grid = (grid,)
+            Jout = vecfunc(*grid)
+            Nshape = shape(Jout)
+            indx = argmin(Jout.ravel(),axis=-1)
+            Nindx = zeros(N,int)
+            xmin = zeros(N,float)
+            for k in range(N-1,-1,-1):
+                thisN = Nshape[k]
+                Nindx[k] = indx % Nshape[k]
+                indx = indx // thisN
+            for k in range(N):
+                xmin[k] = grid[k][tuple(Nindx)]
+
+            Jmin = Jout[tuple(Nindx)]
+            if trace is not None:
+                trace.record(0, Jout.size, Jmin, _grid_spacing(axes), 'grid')
+            if (N==1):
+                grid = grid[0]
+                xmin = xmin[0]
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        # Return the best point evaluated, or the centre of the ranges.
+        xmin, Jmin = gridfunc.best()
+        if xmin is None:
+            xmin = numpy.array([0.5*(ax[0]+ax[-1]) for ax in axes])
+        xmin = numpy.ravel(xmin)
+        if (N==1):
+            xmin = xmin[0]
+        grid = Jout = None
+        finish = None
     if callable(finish):
-        vals = finish(func,xmin,args=args,full_output=1, disp=0)
+        cache = _make_cache(cache)
+        opts = {}
+        if cache is not None:
+            cache.put(xmin, Jmin)
+            opts['cache'] = cache
+        if trace is not None:
+            opts['trace'] = trace
+        if budget is not None:
+            opts['budget'] = budget
+        vals = finish(func,xmin,args=args,full_output=1, disp=0, **opts)
+        if cache is not None:
+            vals = vals[:-1]
         xmin = vals[0]
         Jmin = vals[1]
-        if vals[-1] > 0:
+        if vals[-1] > 0 and not (budget is not None and vals[-1] == 3):
             print "Warning: Final optimization did not succeed"
     if full_output:
         return xmin, Jmin, grid, Jout
@@ -1167,82 +3580,221 @@ def brute(func, ranges, args=(), Ns=20, full_output=0, finish=fmin):
         return xmin
 
 
+def differential_evolution(func, bounds, args=(), popsize=15, maxiter=1000,
+                           maxfun=None, mutation=(0.5, 1.0),
+                           recombination=0.7, tol=0.01, seed=None, x0=None,
+                           polish=True, full_output=0, disp=1, callback=None,
+                           cache=None, trace=None, vectorized=False,
+                           mapper=None, budget=None):
+    """
+    Minimize a function over a box using differential evolution.
+
+    Parameters
+    ----------
+    func : callable func(x,*args)
+        The objective function to be minimized.  If *vectorized*, then
+        *x* is an (M,N) block of points and func returns M values.
+    bounds : sequence
+        Finite (lower, upper) pair for each parameter.
+    args : tuple
+        Extra arguments passed to func.
+    callback : callable
+        Called after each generation, as callback(xk), where xk is the
+        best member of the population.
+
+    Returns
+    -------
+    xopt : ndarray
+        Parameter that minimizes function.
+    fopt : float
+        Value of function at minimum: ``fopt = func(xopt)``.
+    iter : int
+        Number of generations.
+    funcalls : int
+        Number of function calls made, including the polish.
+    warnflag : int
+        1 : Maximum number of function evaluations made.
+        2 : Maximum number of generations reached.
+        3 : Budget exhausted; xopt is the best point evaluated.
+
+    Other parameters
+    ----------------
+    popsize : int
+        The population has popsize*N members.
+    maxiter : int
+        Maximum number of generations.
+    maxfun : int
+        Maximum number of function evaluations before the polish.
+    mutation : float or (float, float)
+        Differential weight F.  Given a range, F is drawn uniformly from
+        it for each generation, which helps convergence.
+    recombination : float
+        Crossover probability CR.
+    tol : float
+        Stop when the standard deviation of the population values is
+        below tol times their mean magnitude.
+    seed : int or RandomState
+        Seed for the random number generator, for reproducible fits.
+    x0 : ndarray
+        Initial guess, included in the initial population.
+    polish : bool
+        If True, refine the best member with `fmin`, using the bounds.
+    full_output : bool
+        If True, return fopt, iter, funcalls and warnflag.
+    disp : bool
+        If True, print convergence messages.
+    cache : int or FunctionCache
+        Cache of previously evaluated population members.  The polish
+        gets a fresh cache of the same size, since the bounded `fmin`
+        caches on its internal parameters.
+    trace : Trace
+        Record the progress of each generation in trace with step
+        'generation', with size the largest spread of the population
+        along any axis.  The trace is passed on to the polish.
+    vectorized : bool
+        If True, func is called with the whole population at once.
+    mapper : callable map(f, points)
+        Map function, such as ``multiprocessing.Pool().map``, used to
+        evaluate the population in parallel.
+    budget : Budget
+        Limit on wall time and function calls, including the polish.
+        Each generation is charged as a whole.
+
+    Notes
+    -----
+    Uses the DE/best/1/bin strategy of Storn and Price.  Each generation
+    forms a mutant ``best + F*(x[r1]-x[r2])`` for every member, from two
+    other random members, and crosses it with the member.  Each trial
+    point replaces its member if it is no worse.  Trial components that
+    leave the box are redrawn uniformly inside it.  All trial points of
+    a generation are scored together in one block, as a single call if
+    *vectorized* or through *mapper*, so the result for a given seed
+    does not depend on how the block is evaluated.
+    """
+    cache = _make_cache(cache)
+    rng = seed if isinstance(seed, numpy.random.RandomState) \
+        else numpy.random.RandomState(seed)
+    lo, hi = asfarray([b[0] for b in bounds]), asfarray([b[1] for b in bounds])
+    if not (numpy.all(numpy.isfinite(lo)) and numpy.all(numpy.isfinite(hi))
+            and numpy.all(lo < hi)):
+        raise ValueError("differential evolution needs finite bounds "
+                         "with lower < upper")
+    N = len(lo)
+    NP = pymax(popsize*N, 5)
+    if maxfun is None:
+        maxfun = numpy.inf
+    fcalls = [0]
+    block = wrap_points(func, args, fcalls, cache=cache,
+                        vectorized=vectorized, mapper=mapper)
+    if trace is not None:
+        block = trace.timed(block)
+    if budget is not None:
+        block = _BudgetFunction(block, budget, block=True)
+    scale = lambda U: lo + U*(hi-lo)
+
+    # Latin hypercube initial population in the unit cube.
+    U = (rng.random_sample((NP,N)) + numpy.arange(NP)[:,None])/NP
+    for k in range(N):
+        U[:,k] = U[rng.permutation(NP),k]
+    if x0 is not None:
+        U[0] = numpy.clip((asfarray(x0).flatten()-lo)/(hi-lo), 0, 1)
+
+    iter = 0
+    try:
+        energy = asarray(block(scale(U)), dtype=float)
+        warnflag = 2
+        while iter < maxiter:
+            if fcalls[0] + NP > maxfun:
+                warnflag = 1
+                break
+            iter += 1
+            best = argmin(energy)
+            if numpy.isscalar(mutation):
+                F = mutation
+            else:
+                F = rng.uniform(*mutation)
+            # Two distinct partners for each member, other than itself.
+            R = numpy.array([rng.permutation(NP-1)[:2] for _ in range(NP)])
+            R += (R >= numpy.arange(NP)[:,None])
+            mutant = U[best] + F*(U[R[:,0]] - U[R[:,1]])
+            cross = rng.random_sample((NP,N)) < recombination
+            cross[numpy.arange(NP), rng.randint(N, size=NP)] = True
+            trial = numpy.where(cross, mutant, U)
+            outside = (trial < 0) | (trial > 1)
+            trial[outside] = rng.random_sample(numpy.sum(outside))
+            ftrial = asarray(block(scale(trial)), dtype=float)
+            keep = ftrial <= energy
+            U[keep], energy[keep] = trial[keep], ftrial[keep]
+            best = argmin(energy)
+            if trace is not None:
+                spread = numpy.max(numpy.ptp(scale(U), axis=0))
+                trace.record(iter, fcalls[0], energy[best], spread,
+                             'generation')
+            if callback is not None:
+                callback(scale(U[best]))
+            if numpy.std(energy) <= tol*abs(numpy.mean(energy)):
+                warnflag = 0
+                break
+        x, fval = scale(U[argmin(energy)]), numpy.min(energy)
+    except _BudgetExceeded:
+        if budget is None:
+            raise
+        x, fval = block.best()
+        if x is None:
+            # Nothing was evaluated; U[0] is x0 if it was given.
+            x = scale(U[0])
+        warnflag = 3
+    funcalls = fcalls[0]
+
+    if polish and warnflag != 3:
+        if vectorized:
+            def pointfunc(x, *args):
+                return func(numpy.reshape(x, (1,N)), *args)[0]
+        else:
+            pointfunc = func
+        opts = {}
+        if cache is not None:
+            # The bounded fmin caches on its internal parameters, so it
+            # can't share the population cache keyed on external points.
+            opts['cache'] = FunctionCache(cache.maxsize)
+        if trace is not None:
+            opts['trace'] = trace
+        if budget is not None:
+            opts['budget'] = budget
+        vals = fmin(pointfunc, x, args=args, bounds=zip(lo, hi),
+                    full_output=1, disp=0, **opts)
+        funcalls += vals[3]
+        if vals[1] <= fval:
+            x, fval = vals[0], vals[1]
+        if vals[4] == 3:
+            warnflag = 3
+
+    if warnflag == 1:
+        if disp:
+            print "Warning: Maximum number of function evaluations has "\
+                  "been exceeded."
+    elif warnflag == 2:
+        if disp:
+            print "Warning: Maximum number of iterations has been exceeded"
+    elif warnflag == 3:
+        if disp:
+            print "Warning: Budget exhausted; returning the best point so far."
+    else:
+        if disp:
+            print "Optimization terminated successfully."
+            print "         Current function value: %f" % fval
+            print "         Iterations: %d" % iter
+            print "         Function evaluations: %d" % funcalls
+
+    if full_output:
+        return x, fval, iter, funcalls, warnflag
+    else:
+        return x
+
 def main():
-    import time
-
-    times = []
-    algor = []
-    x0 = [0.8,1.2,0.7]
-    print "Nelder-Mead Simplex"
-    print "==================="
-    start = time.time()
-    x = fmin(rosen,x0)
-    print x
-    times.append(time.time() - start)
-    algor.append('Nelder-Mead Simplex\t')
-
-    print
-    print "Powell Direction Set Method"
-    print "==========================="
-    start = time.time()
-    x = fmin_powell(rosen,x0)
-    print x
-    times.append(time.time() - start)
-    algor.append('Powell Direction Set Method.')
-
-    print
-    print "Nonlinear CG"
-    print "============"
-    start = time.time()
-    x = fmin_cg(rosen, x0, fprime=rosen_der, maxiter=200)
-    print x
-    times.append(time.time() - start)
-    algor.append('Nonlinear CG     \t')
-
-    print
-    print "BFGS Quasi-Newton"
-    print "================="
-    start = time.time()
-    x = fmin_bfgs(rosen, x0, fprime=rosen_der, maxiter=80)
-    print x
-    times.append(time.time() - start)
-    algor.append('BFGS Quasi-Newton\t')
-
-    print
-    print "BFGS approximate gradient"
-    print "========================="
-    start = time.time()
-    x = fmin_bfgs(rosen, x0, gtol=1e-4, maxiter=100)
-    print x
-    times.append(time.time() - start)
-    algor.append('BFGS without gradient\t')
-
-
-    print
-    print "Newton-CG with Hessian product"
-    print "=============================="
-    start = time.time()
-    x = fmin_ncg(rosen, x0, rosen_der, fhess_p=rosen_hess_prod, maxiter=80)
-    print x
-    times.append(time.time() - start)
-    algor.append('Newton-CG with hessian product')
-
-
-    print
-    print "Newton-CG with full Hessian"
-    print "==========================="
-    start = time.time()
-    x = fmin_ncg(rosen, x0, rosen_der, fhess=rosen_hess, maxiter=80)
-    print x
-    times.append(time.time() - start)
-    algor.append('Newton-CG with full hessian')
-
-    print
-    print "\nMinimizing the Rosenbrock function of order 3\n"
-    print " Algorithm \t\t\t       Seconds"
-    print "===========\t\t\t      ========="
-    for k in range(len(algor)):
-        print algor[k], "\t -- ", times[k]
+    """Run the optimizer benchmarks; see benchmark.py for options."""
+    import benchmark
+    benchmark.main()
 
 if __name__ == "__main__":
     main()